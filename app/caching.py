@@ -0,0 +1,109 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Maximum number of rendered responses kept in memory
+RESPONSE_CACHE_SIZE = 128
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a weak ETag from the versions a response depends on.
+
+    The ETag is weak because GZipMiddleware compresses the body after it is
+    set: the gzip and identity encodings of a response share it, which a
+    strong validator does not allow.
+
+    Args:
+        parts: Versions and parameters of the response
+
+    Returns:
+        Weak ETag value (W/"...")
+    """
+    source = "\x1f".join(str(part) for part in parts)
+    return 'W/"' + hashlib.blake2b(source.encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+
+def validator_headers(etag: str, last_modified: float) -> Dict[str, str]:
+    """Return the ETag, Last-Modified, Cache-Control and Vary headers of a response."""
+    # Le corps peut être compressé ou non selon Accept-Encoding
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if last_modified:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """
+    Check the conditional headers of a request against the current validators.
+
+    If-None-Match takes precedence over If-Modified-Since and uses the weak
+    comparison, as in RFC 9110.
+
+    Args:
+        request: Incoming request
+        etag: Current ETag of the resource
+        last_modified: Current modification time of the resource
+
+    Returns:
+        True if the client copy is still valid
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag.removeprefix("W/") in tags or "*" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # Les dates HTTP sont à la seconde près
+        return int(last_modified) <= int(since)
+    return False
+
+
+def not_modified_response(etag: str, last_modified: float) -> Response:
+    """Return an empty 304 response carrying the validators."""
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+
+class ResponseCache:
+    """
+    LRU cache of rendered response bodies, keyed by ETag.
+
+    The ETag changes with the files the response depends on, so entries
+    never need to be invalidated: stale ones are evicted by newer ones.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str) -> Optional[Tuple[bytes, str]]:
+        """Return the cached (body, media type) for an ETag, if any."""
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry
+
+    def put(self, etag: str, body: bytes, media_type: str) -> None:
+        """Store a rendered body, evicting the least recently used one when full."""
+        with self._lock:
+            self._entries[etag] = (body, media_type)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
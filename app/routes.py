@@ -1,13 +1,27 @@
-from fastapi import APIRouter, Request, Form
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi import APIRouter, Request, Form, HTTPException
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
-from src.facet import get_all_values, get_value_from_rawValue,get_rawValue_from_value
-from src.fetch import get_total_results
-from src.utils import load_json, save_json
-from src.query import generate_query
+from src.facet import DEFAULT_SUGGESTIONS, FACET_DATA_PATH, get_all_values, get_facet_index, get_value_from_rawValue,get_rawValue_from_value
+from src.core import count_queue, schedule_total_results
+from src.fetch import preview_query
+from src.alert_store import ALERTS_PATH, add_alert, load_alerts, remove_alert, update_alert as update_stored_alert
+from src.utils import file_mtime, file_version, load_json
+from src.clustering import embed_query, get_backend
+from src.vector_index import DEFAULT_TOP_K, get_index
+from src.jobs import queues_status
+from src.outbox import outbox_status
+from src.query import generate_query, query_digest
+from src.message_template import render_message
+from src.metrics import render_metrics
+from src.tracing import TRACE_BUFFER_SIZE, recent_traces, trace_timeline
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+from app.caching import ResponseCache, is_not_modified, make_etag, not_modified_response, validator_headers
+import asyncio
+import base64
+import glob
 import os
+import time
 import logging  
 import json
 
@@ -17,16 +31,34 @@ TYPE_MAPPINGS: Dict[str, str] = {
     "8": "Calls for funding in cascade (issued by funded projects)"
 }
 
-ALERTS_PATH = "config/alerts.json"
 DATA_FOLDER = "data"
+CLUSTERS_PATH = f"{DATA_FOLDER}/clusters.json"
+TEMPLATES_FOLDER = "app/templates"
+
+# Version of the deployed code, part of every ETag; without APP_BUILD_ID each start invalidates them
+APP_VERSION = os.getenv("APP_BUILD_ID") or f"{time.time_ns():x}"
+
+# Pagination of the details of an alert
+DETAILS_PAGE_SIZE = 20
+MAX_DETAILS_PAGE_SIZE = 100
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory=TEMPLATES_FOLDER)
+# Pages et réponses JSON déjà calculées, indexées par ETag
+response_cache = ResponseCache()
 
 @router.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request, alert: Optional[str] = None):
+    # La page ne dépend que des alertes, des clusters et des facettes : inutile de la recalculer s'ils n'ont pas changé
+    etag, last_modified = _page_validators("dashboard", alert)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    cached = response_cache.get(etag)
+    if cached:
+        return Response(content=cached[0], media_type=cached[1], headers=validator_headers(etag, last_modified))
+
     # Load all alerts for sidebar
-    all_alerts = load_json(ALERTS_PATH)
+    all_alerts = load_alerts()
     
     # Use selected alert or default
     if alert:
@@ -37,7 +69,7 @@ async def dashboard(request: Request, alert: Optional[str] = None):
         current_alert_name = "default"
     alert_config, available_query = load_config(current_alert_name)
 
-    clusters = load_json(f"{DATA_FOLDER}/clusters.json")
+    clusters = load_json(CLUSTERS_PATH) or []
     # Récupérer les données de cluster correspondant au nom de l'alerte
     clusters_data = None
     for cluster_entry in clusters:
@@ -45,25 +77,29 @@ async def dashboard(request: Request, alert: Optional[str] = None):
             clusters_data = cluster_entry[current_alert_name]
             break
 
-    return templates.TemplateResponse("index.html", {
+    response = templates.TemplateResponse("index.html", {
         "request": request,
         "alert": alert_config,
         "available_query": available_query,
         "alerts": all_alerts,
         "current_alert": current_alert_name,
         "clusters_data": clusters_data
-    })
+    }, headers=validator_headers(etag, last_modified))
+    response_cache.put(etag, response.body, "text/html; charset=utf-8")
+    return response
+
+def _page_validators(*params) -> Tuple[str, float]:
+    """
+    Return the ETag and the last modification time of a page built from the
+    alerts, clusters and facets, rendered by the templates of this version of the app.
+    """
+    paths = (ALERTS_PATH, CLUSTERS_PATH, FACET_DATA_PATH, *sorted(glob.glob(f"{TEMPLATES_FOLDER}/*.html")))
+    etag = make_etag(APP_VERSION, *params, *(file_version(path) for path in paths))
+    return etag, max(file_mtime(path) for path in paths)
 
 @router.get("/delete-alert", response_class=RedirectResponse)
 async def delete_alert(name: str):
-    alerts = load_json(ALERTS_PATH)
-    
-    # Filter out the alert to delete
-    updated_alerts = [a for a in alerts if a.get("name") != name]
-    
-    # Don't delete if it's the last alert
-    if len(updated_alerts) > 0:
-        save_json(updated_alerts, ALERTS_PATH)
+    remove_alert(name)
 
     # delete alert file if exists
     alert_file_path = f"{DATA_FOLDER}/alerts/{name}.json"
@@ -84,7 +120,7 @@ async def delete_alert(name: str):
 
 @router.post("/create-alert", response_class=RedirectResponse)
 async def create_alert(new_alert_name: str = Form(...)):
-    alerts = load_json(ALERTS_PATH)
+    alerts = load_alerts()
     # Check if name already exists
     if not any(a.get("name") == new_alert_name for a in alerts):
         # Create new alert with default values
@@ -105,7 +141,6 @@ async def create_alert(new_alert_name: str = Form(...)):
             "updated": True
         }
 
-        total_results = await get_total_results(new_alert)
         # delete query file if exists
         alert_file_path = f"{DATA_FOLDER}/alerts/{new_alert_name}.json"
         alert_query_file_path = f"{DATA_FOLDER}/alerts/{new_alert_name}_query.json"
@@ -124,9 +159,10 @@ async def create_alert(new_alert_name: str = Form(...)):
         except Exception as e:
             logging.error(f"Error deleting {alert_query_file_path}: {str(e)}")
         
-        new_alert["totalResults"] = total_results
-        alerts.append(new_alert)
-        save_json(alerts, ALERTS_PATH)
+        # Le nombre de résultats est calculé en arrière-plan
+        new_alert["countPending"] = True
+        if add_alert(new_alert):
+            schedule_total_results(new_alert_name)
 
     return RedirectResponse(f"/?alert={new_alert_name}", status_code=303)
 
@@ -150,8 +186,284 @@ async def update_alert(
 ):  
     # Utiliser le nom de l'alerte récupéré du formulaire
     current_alert_name = alert_name
-    alerts = load_json(ALERTS_PATH)
     
+    query = build_query_from_form(
+        type, status, frameworkProgramme, callIdentifier,
+        startDate_start, startDate_end, deadlineDate_start, deadlineDate_end, text_search
+    )
+    
+    keywords_list = [k.strip() for k in keywords.split(",") if k.strip()]
+
+    def apply_form(alert):
+        # Reset lastDetails if query or keywords changed
+        # Deux requêtes équivalentes (ordre des termes ou des clauses) ont le même digest
+        if query_digest(alert.get("query")) != query_digest(query) or \
+           alert.get("keywords") != keywords_list:
+            print("Query or keywords changed, resetting lastDetails")
+            alert["lastDetails"] = []
+            alert["updated"] = True
+        alert["emails"] = [e.strip() for e in emails.split(",") if e.strip()]
+        alert["interval"] = interval
+        alert["message"] = message
+        alert["keywords"] = keywords_list
+        alert["query"] = query
+        alert["countPending"] = True
+
+    # Le nombre de résultats est calculé en arrière-plan, la redirection est immédiate
+    if update_stored_alert(current_alert_name, apply_form):
+        schedule_total_results(current_alert_name)
+
+    return RedirectResponse(f"/?alert={current_alert_name}", status_code=303)
+
+@router.get("/api/alerts/{name}/count")
+async def alert_count(name: str):
+    """Return the total results count of an alert and whether it is being refreshed."""
+    alert = next((a for a in load_alerts() if a.get("name") == name), None)
+    if alert is None:
+        raise HTTPException(status_code=404, detail=f"Alert '{name}' not found")
+    return {
+        "totalResults": alert.get("totalResults", 0),
+        "pending": bool(alert.get("countPending")) or count_queue.is_pending(name),
+        "error": bool(alert.get("countError")),
+    }
+
+@router.get("/api/jobs")
+async def jobs_status():
+    """Return the depth and latencies of the background job queues and the outbox counts."""
+    return {"queues": queues_status(), "outbox": outbox_status()}
+
+@router.get("/debug/traces", response_class=HTMLResponse)
+async def debug_traces(request: Request, limit: int = 20):
+    """Render the last traced cycles and background jobs as waterfalls."""
+    traces = [trace_timeline(spans) for spans in recent_traces(max(1, min(limit, TRACE_BUFFER_SIZE)))]
+    return templates.TemplateResponse("debug_traces.html", {"request": request, "traces": traces})
+
+@router.get("/metrics")
+async def metrics():
+    """Expose the process metrics in the Prometheus text format."""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/api/similar")
+async def similar_calls(reference: Optional[str] = None, q: Optional[str] = None, k: int = DEFAULT_TOP_K):
+    """Return the stored calls most similar to a reference or to a free-text query."""
+    index = get_index(get_backend().name)
+    k = max(1, min(k, 100))
+
+    if reference:
+        vector = await asyncio.to_thread(index.vector_for_reference, reference)
+        if vector is None:
+            raise HTTPException(status_code=404, detail=f"No embedding stored for reference '{reference}'")
+    elif q and q.strip():
+        vector = await embed_query(q.strip())
+    else:
+        raise HTTPException(status_code=400, detail="A reference or a query (q) is required")
+
+    hits = await asyncio.to_thread(index.search, vector, k, reference)
+
+    # Retrouver le détail stocké et les alertes de chaque appel
+    stored = {}
+    for stored_alert in load_alerts():
+        for detail in stored_alert.get("lastDetails", []):
+            ref = detail.get("reference")
+            if ref:
+                entry = stored.setdefault(ref, {"detail": detail, "alerts": []})
+                entry["alerts"].append(stored_alert.get("name"))
+
+    results = []
+    for ref, score in hits:
+        entry = stored.get(ref, {"detail": {}, "alerts": []})
+        detail = entry["detail"]
+        results.append({
+            "reference": ref,
+            "score": round(score, 4),
+            "identifier": detail.get("identifier"),
+            "title": detail.get("title"),
+            "deadline": detail.get("deadline"),
+            "url": detail.get("url"),
+            "alerts": entry["alerts"],
+        })
+
+    return {"reference": reference, "q": q, "results": results}
+
+@router.post("/api/preview")
+async def preview(
+    type: List[str] = Form(default=[]),
+    status: List[str] = Form(default=[]),
+    frameworkProgramme: str = Form(None),
+    callIdentifier: str = Form(None),
+    startDate_start: str = Form(None),
+    startDate_end: str = Form(None),
+    deadlineDate_start: str = Form(None),
+    deadlineDate_end: str = Form(None),
+    text_search: str = Form(None),
+):
+    """Return the total count and the first results of the query described by the form, without saving it."""
+    query = build_query_from_form(
+        type, status, frameworkProgramme, callIdentifier,
+        startDate_start, startDate_end, deadlineDate_start, deadlineDate_end, text_search
+    )
+    try:
+        return await preview_query(query)
+    except Exception as e:
+        logging.warning(f"Preview failed: {e}")
+        raise HTTPException(status_code=502, detail="The EC API did not answer the preview request")
+
+@router.get("/api/facets/{name}/suggest")
+async def facet_suggestions(name: str, q: str = "", limit: int = DEFAULT_SUGGESTIONS):
+    """Return the values of a facet starting with or containing q."""
+    index = get_facet_index(name)
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"Facet '{name}' not found")
+    return {"facet": name, "q": q, "suggestions": index.suggest(q, max(1, min(limit, 100)))}
+
+@router.get("/api/alerts/{name}/details")
+async def alert_details(
+    request: Request,
+    name: str,
+    cursor: Optional[str] = None,
+    limit: int = DETAILS_PAGE_SIZE,
+    cluster: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
+    """Return a page of the details of an alert, newest first, rendered with the alert message."""
+    etag, last_modified = _page_validators("details", name, cursor, limit, cluster, status, since, until)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    cached = response_cache.get(etag)
+    if cached:
+        return Response(content=cached[0], media_type=cached[1], headers=validator_headers(etag, last_modified))
+
+    alert = next((a for a in load_alerts() if a.get("name") == name), None)
+    if alert is None:
+        raise HTTPException(status_code=404, detail=f"Alert '{name}' not found")
+
+    try:
+        since_date = datetime.strptime(since, "%Y-%m-%d").date() if since else None
+        until_date = datetime.strptime(until, "%Y-%m-%d").date() if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must use the YYYY-MM-DD format")
+
+    # Un détail sans référence ne peut pas servir de curseur : il n'est pas listé
+    details = [
+        detail for detail in alert.get("lastDetails", [])
+        if detail.get("reference") and _detail_matches(detail, cluster, status, since_date, until_date)
+    ]
+
+    # Le curseur est la référence du dernier élément renvoyé : stable quand de nouveaux détails sont ajoutés en tête
+    start = 0
+    if cursor:
+        last_reference = _decode_cursor(cursor)
+        position = next((i for i, d in enumerate(details) if d.get("reference") == last_reference), None)
+        if position is None:
+            raise HTTPException(status_code=400, detail="Unknown cursor, reload from the first page")
+        start = position + 1
+
+    limit = max(1, min(limit, MAX_DETAILS_PAGE_SIZE))
+    page = details[start:start + limit]
+    has_more = start + limit < len(details)
+
+    response = JSONResponse({
+        "total": len(details),
+        "items": [
+            {
+                "reference": detail.get("reference"),
+                "retrieved_at": detail.get("retrieved_at"),
+                "cluster": detail.get("cluster"),
+                "status": detail.get("status"),
+                "html": render_message(alert.get("message"), detail, link_url=True),
+            }
+            for detail in page
+        ],
+        "next_cursor": _encode_cursor(page[-1].get("reference")) if page and has_more else None,
+    }, headers=validator_headers(etag, last_modified))
+    response_cache.put(etag, response.body, "application/json")
+    return response
+
+def _detail_matches(detail, cluster, status, since_date, until_date) -> bool:
+    if cluster not in (None, "", "all") and str(detail.get("cluster")) != cluster:
+        return False
+    if status and detail.get("status") != status:
+        return False
+    if since_date or until_date:
+        try:
+            retrieved = datetime.strptime(detail.get("retrieved_at", ""), "%d-%m-%Y %H:%M:%S").date()
+        except (TypeError, ValueError):
+            return False
+        if (since_date and retrieved < since_date) or (until_date and retrieved > until_date):
+            return False
+    return True
+
+def _encode_cursor(reference: Optional[str]) -> str:
+    return base64.urlsafe_b64encode(str(reference or "").encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def load_config(alert_name):
+    alerts = load_alerts()
+    alert = next((a for a in alerts if a.get("name") == alert_name), None)
+    
+    # If alert not found, use the first one or create default
+    if not alert:
+        if alerts:
+            alert = alerts[0]
+        else:
+            alert = {
+                "name": "default",
+                "interval": 60,
+                "emails": [],
+                "message": "",
+                "keywords": [],
+                "query": {},
+                "lastDetails": [],
+                "totalResults": 0,
+            }
+
+    name = alert.get("name")
+    interval = alert.get("interval", 60)
+    emails = alert.get("emails", [])
+    message = alert.get("message", "")
+    keywords = alert.get("keywords", [])
+    query = transform_query(alert.get("query", {}))
+    # Les détails sont chargés page par page par /api/alerts/{name}/details
+    details_count = len(alert.get("lastDetails", []))
+    total_results = alert.get("totalResults", 0)
+    available_query = {
+        "type": ["Direct calls for proposals (issued by the EU)", "EU External Actions", "Calls for funding in cascade (issued by funded projects)"],
+        "status": get_all_values("status"),
+        # frameworkProgramme et callIdentifier sont proposés à la demande par /api/facets/{name}/suggest
+    }
+
+    return {
+        "name": name,
+        "interval": interval,
+        "emails": emails,
+        "message": message,
+        "keywords": keywords,
+        "query": query,
+        "detailsCount": details_count,
+        "totalResults": total_results,
+        "countPending": bool(alert.get("countPending")),
+        "countError": bool(alert.get("countError")),
+    }, available_query
+
+def build_query_from_form(
+    types: List[str],
+    statuses: List[str],
+    frameworkProgramme: Optional[str],
+    callIdentifier: Optional[str],
+    startDate_start: Optional[str],
+    startDate_end: Optional[str],
+    deadlineDate_start: Optional[str],
+    deadlineDate_end: Optional[str],
+    text_search: Optional[str],
+) -> Dict:
+    """Build the API query from the fields of the alert form, readable values mapped to raw values."""
     # Helper to parse dates with different formats
     def parse_date(date_str):
         if not date_str:
@@ -198,85 +510,16 @@ async def update_alert(
         if deadline_lte:
             deadline_range["lte"] = deadline_lte
 
-    mapped_types = [k for t in type for k, v in TYPE_MAPPINGS.items() if v == t.strip()]
-    query = generate_query(
+    mapped_types = [k for t in types for k, v in TYPE_MAPPINGS.items() if v == t.strip()]
+    return generate_query(
         types=mapped_types,
-        statuses=[get_rawValue_from_value(s.strip(), "status") for s in status if s],
+        statuses=[get_rawValue_from_value(s.strip(), "status") for s in statuses if s],
         framework_programmes=get_rawValue_from_value(frameworkProgramme.strip(), "frameworkProgramme") if frameworkProgramme else None,
         call_identifier=get_rawValue_from_value(callIdentifier.strip(), "callIdentifier") if callIdentifier else None,
         starting_date_range=start_date_range,
         deadline_range=deadline_range,
-        text_search=text_search.strip()
+        text_search=(text_search or "").strip()
     )
-    
-    for alert in alerts:
-        if alert.get("name") == current_alert_name:
-            # Reset lastDetails if query or keywords changed
-            # Convertir les dictionnaires en JSON pour comparer leur contenu
-            if json.dumps(alert.get("query", {}), sort_keys=True) != json.dumps(query, sort_keys=True) or \
-               alert.get("keywords") != [k.strip() for k in keywords.split(",") if k.strip()]:
-                print("Query or keywords changed, resetting lastDetails")
-                alert["lastDetails"] = []
-                alert["updated"] = True
-            alert["emails"] = [e.strip() for e in emails.split(",") if e.strip()]
-            alert["interval"] = interval
-            alert["message"] = message
-            alert["keywords"] = [k.strip() for k in keywords.split(",") if k.strip()]
-            alert["query"] = query
-
-            total_results = await get_total_results(alert)
-            
-            alert["totalResults"] = total_results
-            break
-
-    save_json(alerts, ALERTS_PATH)
-    return RedirectResponse(f"/?alert={current_alert_name}", status_code=303)
-
-def load_config(alert_name):
-    alerts = load_json(ALERTS_PATH)
-    alert = next((a for a in alerts if a.get("name") == alert_name), None)
-    
-    # If alert not found, use the first one or create default
-    if not alert:
-        if alerts:
-            alert = alerts[0]
-        else:
-            alert = {
-                "name": "default",
-                "interval": 60,
-                "emails": [],
-                "message": "",
-                "keywords": [],
-                "query": {},
-                "lastDetails": [],
-                "totalResults": 0,
-            }
-
-    name = alert.get("name")
-    interval = alert.get("interval", 60)
-    emails = alert.get("emails", [])
-    message = alert.get("message", "")
-    keywords = alert.get("keywords", [])
-    query = transform_query(alert.get("query", {}))
-    details = alert.get("lastDetails", [])
-    total_results = alert.get("totalResults", 0)
-    available_query = {
-        "type": ["Direct calls for proposals (issued by the EU)", "EU External Actions", "Calls for funding in cascade (issued by funded projects)"],
-        "status": get_all_values("status"),
-        "frameworkProgramme": get_all_values("frameworkProgramme"),
-        "callIdentifier": get_all_values("callIdentifier"),
-    }
-
-    return {
-        "name": name,
-        "interval": interval,
-        "emails": emails,
-        "message": message,
-        "keywords": keywords,
-        "query": query,
-        "details": details,
-        "totalResults": total_results
-    }, available_query
 
 def transform_query(raw_query):
     query = {
@@ -0,0 +1,240 @@
+"""
+Benchmark of the clustering pipeline, stage by stage.
+
+Runs the stage functions of a full clustering of an alert (the ones
+src.clustering.run_clustering calls) on synthetic records, or on the calls
+found in a cassette recorded with EC_API_CASSETTE_MODE=record:
+
+    load_records   details of the alert read from the alerts file
+    frame          records flattened into a DataFrame
+    clean_text     clean text of each record (prepare_text)
+    embed          embeddings through the embedding cache, cold (offline hashing backend by default)
+    kmeans         KMeans on the embeddings, centroids saved
+    tfidf_labels   TF-IDF keywords and titles of the clusters
+    summary        result of the clustering, with the mean similarity to the centroids
+    save           clusters.json and cluster labels written back to the alert
+
+Each size is timed (best of --repeat runs), then run once more under
+tracemalloc for the peak memory of each stage. With --baseline, stages
+slower than the baseline by more than --tolerance are reported and the
+command exits with status 1.
+
+Usage:
+    python -m benchmarks.bench_clustering [--sizes 300 3000 30000] [--cassette data/cassette.jsonl.gz] [--output clustering.json] [--baseline previous.json]
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from benchmarks.corpus import make_records
+
+ALERT_NAME = "bench"
+STAGES = ["load_records", "frame", "clean_text", "embed", "kmeans", "tfidf_labels", "summary", "save"]
+# Caches vidés avant chaque passage, pour mesurer un premier clustering
+CACHE_FOLDERS = ["data/embeddings", "data/centroids"]
+
+
+def load_cassette_records(path: str) -> List[Dict[str, Any]]:
+    """
+    Extract the call details of the search results recorded in a cassette.
+
+    Args:
+        path: Gzip cassette written by src.request in record mode
+
+    Returns:
+        Details shaped like lastDetails, one per distinct reference
+    """
+    from src.fetch import _extract_call_details, _get_first_value
+
+    records: Dict[str, Dict[str, Any]] = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line).get("result")
+            if not isinstance(result, dict):
+                continue
+            for item in result.get("results", []):
+                reference = item.get("reference")
+                identifier = _get_first_value(item.get("metadata", {}).get("identifier"))
+                if reference and identifier and reference not in records:
+                    records[reference] = _extract_call_details(item, identifier)
+    return list(records.values())
+
+
+def _sample(corpus: List[Dict[str, Any]], size: int) -> List[Dict[str, Any]]:
+    # Un corpus enregistré plus petit que la taille demandée est répété avec des références distinctes
+    records = []
+    for i in range(size):
+        record = dict(corpus[i % len(corpus)])
+        if i >= len(corpus):
+            record["reference"] = f"{record.get('reference')}#{i // len(corpus)}"
+        records.append(record)
+    return records
+
+
+def _clear_caches() -> None:
+    from src import clustering, text
+
+    for folder in CACHE_FOLDERS:
+        shutil.rmtree(folder, ignore_errors=True)
+    clustering._store = None
+    text._cache.clear()
+
+
+def run_pipeline(records: List[Dict[str, Any]], n_clusters: int, measure: Callable[[str, Callable[[], Any]], Any]) -> None:
+    """Run the stages of a full clustering, each one through measure(stage, function)."""
+    from src import clustering
+    from src.alert_store import save_alerts
+
+    save_alerts([{"name": ALERT_NAME, "emails": [], "lastDetails": records}])
+    _clear_caches()
+
+    details = measure("load_records", lambda: clustering.load_records(ALERT_NAME))
+    df = measure("frame", lambda: clustering.records_frame(details))
+    measure("clean_text", lambda: clustering.add_clean_text(df, details))
+    emb = measure("embed", lambda: clustering.embed_records(df))
+    n_clusters = min(n_clusters, len(df))
+    labels, positions, centroids = measure(
+        "kmeans", lambda: clustering.fit_clusters(emb, n_clusters, ALERT_NAME, None)
+    )
+    clusters = measure("tfidf_labels", lambda: clustering.cluster_keywords(df, labels))
+    result = measure(
+        "summary", lambda: clustering.full_result(df, emb, labels, positions, centroids, clusters)
+    )
+    measure("save", lambda: clustering.save_cluster_details(result, ALERT_NAME))
+
+
+def benchmark(records: List[Dict[str, Any]], n_clusters: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Time each stage (best of repeat runs), then measure its peak traced memory."""
+    seconds: Dict[str, float] = {}
+
+    def timed(stage: str, func: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - start
+        seconds[stage] = min(seconds.get(stage, elapsed), elapsed)
+        return value
+
+    # Chargement du modèle, hors mesure
+    from src.clustering import get_backend
+    get_backend().encode(["warm up"])
+
+    for _ in range(repeat):
+        run_pipeline(records, n_clusters, timed)
+
+    # tracemalloc ralentit le code Python : la mémoire est mesurée dans un passage séparé
+    peak_mb: Dict[str, float] = {}
+
+    def traced(stage: str, func: Callable[[], Any]) -> Any:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        value = func()
+        peak_mb[stage] = (tracemalloc.get_traced_memory()[1] - base) / (1024 * 1024)
+        return value
+
+    tracemalloc.start()
+    try:
+        run_pipeline(records, n_clusters, traced)
+    finally:
+        tracemalloc.stop()
+
+    return {stage: {"seconds": round(seconds[stage], 4), "peak_mb": round(peak_mb[stage], 1)} for stage in STAGES}
+
+
+def find_regressions(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    """
+    Compare the stage times with a previous report.
+
+    Args:
+        results: Results of this run
+        baseline_path: Report written by a previous run with --output
+        tolerance: Allowed relative slowdown (0.25 for 25 %)
+
+    Returns:
+        One message per stage slower than the baseline beyond the tolerance
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["records"]: r["stages"] for r in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        before = baseline.get(result["records"])
+        if not before:
+            continue
+        for stage, current in result["stages"].items():
+            previous = before.get(stage, {}).get("seconds")
+            if previous and current["seconds"] > previous * (1 + tolerance):
+                regressions.append(
+                    f"{stage} at {result['records']} records: {current['seconds']}s vs {previous}s "
+                    f"(x{current['seconds'] / previous:.2f})"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 3000, 30000])
+    parser.add_argument("--clusters", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", default="hashing", help="embedding backend, 'hashing' works offline")
+    parser.add_argument("--cassette", help="take the records from this cassette instead of synthetic ones")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="previous JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    source = os.getcwd()
+    corpus = load_cassette_records(os.path.abspath(args.cassette)) if args.cassette else None
+    if corpus is not None and not corpus:
+        raise SystemExit(f"No search results found in {args.cassette}")
+
+    # Le backend est lu à l'import de src.clustering
+    os.environ["EMBEDDING_BACKEND"] = args.backend
+
+    results = []
+    for size in args.sizes:
+        records = _sample(corpus, size) if corpus else make_records(size, args.clusters)
+        workdir = tempfile.mkdtemp(prefix="bench_clustering_")
+        try:
+            # Fichiers d'alertes, de clusters et cache d'embeddings propres à chaque taille
+            os.chdir(workdir)
+            os.makedirs("data", exist_ok=True)
+            stages = benchmark(records, args.clusters, args.repeat)
+        finally:
+            os.chdir(source)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        results.append({"records": size, "stages": stages})
+        print(f"{size:>6} records")
+        for stage, figures in stages.items():
+            print(f"  {stage:<14} {figures['seconds'] * 1000:10.1f} ms  peak {figures['peak_mb']:8.1f} MB")
+
+    if args.output:
+        summary = {
+            "backend": args.backend,
+            "clusters": args.clusters,
+            "corpus": args.cassette or "synthetic",
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+
+    if args.baseline:
+        regressions = find_regressions(results, args.baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark of the embedding backends.
+
+Each backend embeds the same synthetic records in its own process and
+reports its throughput and peak memory. The records are then clustered with
+KMeans and the clusterings are compared with each other and with the topics
+of the records (adjusted Rand index).
+
+Usage:
+    python -m benchmarks.bench_embedding [--records 1000] [--backends transformer hashing] [--output results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Any, Dict, List
+
+from benchmarks.corpus import make_records
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss est en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(kind: str, texts: List[str], n_clusters: int) -> Dict[str, Any]:
+    """Embed and cluster the texts with one backend. Runs in a fresh process."""
+    from sklearn.cluster import KMeans
+    from src.clustering import create_backend
+
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    backend = create_backend(kind)
+    backend.encode(texts[:1])  # chargement du modèle
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    emb = backend.encode(texts)
+    encode_time = time.perf_counter() - start
+
+    labels = KMeans(n_clusters=n_clusters, random_state=42).fit_predict(emb)
+    return {
+        "backend": backend.name,
+        "dimensions": int(emb.shape[1]),
+        "load_seconds": round(load_time, 3),
+        "encode_seconds": round(encode_time, 3),
+        "texts_per_second": round(len(texts) / encode_time, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_increase_mb": round(_peak_rss_mb() - rss_before, 1),
+        "labels": labels.tolist(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--clusters", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=["transformer", "hashing"])
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    from sklearn.metrics import adjusted_rand_score
+    from src.text import build_text
+
+    records = make_records(args.records, args.clusters)
+    texts = [build_text(record) for record in records]
+    topics = [record["topic"] for record in records]
+
+    results = {}
+    for kind in args.backends:
+        # Un processus par backend pour isoler la mémoire de chacun
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results[kind] = executor.submit(run_backend, kind, texts, args.clusters).result()
+        result = results[kind]
+        result["agreement_with_topics"] = round(adjusted_rand_score(topics, result["labels"]), 3)
+        print(
+            f"{result['backend']:<40} {result['texts_per_second']:>9} texts/s  "
+            f"load {result['load_seconds']:>6}s  peak RSS {result['peak_rss_mb']:>7} MB  "
+            f"ARI vs topics {result['agreement_with_topics']}"
+        )
+
+    agreement = {}
+    for a, b in combinations(results, 2):
+        agreement[f"{a}/{b}"] = round(adjusted_rand_score(results[a]["labels"], results[b]["labels"]), 3)
+        print(f"Cluster agreement {a} / {b}: ARI {agreement[f'{a}/{b}']}")
+
+    if args.output:
+        summary = {
+            "records": args.records,
+            "clusters": args.clusters,
+            "backends": {kind: {k: v for k, v in r.items() if k != "labels"} for kind, r in results.items()},
+            "agreement": agreement,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
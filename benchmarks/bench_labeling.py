@@ -0,0 +1,100 @@
+"""
+Micro-benchmark of the cluster labeling step.
+
+Compares the vectorized `label_clusters` with the previous per-cluster
+implementation on synthetic documents.
+
+Usage:
+    python -m benchmarks.bench_labeling [--sizes 300 10000] [--clusters 10] [--skip-legacy]
+"""
+import argparse
+import random
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.clustering import custom_stopwords, generate_title, label_clusters
+
+VOCABULARY_SIZE = 3000
+WORDS_PER_DOCUMENT = 120
+
+
+def make_documents(n_documents: int, n_clusters: int, seed: int = 42) -> List[str]:
+    """Generate documents whose words are drawn from a topic per cluster."""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(VOCABULARY_SIZE)] + ["nan", "banana"]
+    topic_size = VOCABULARY_SIZE // n_clusters
+    documents = []
+    for i in range(n_documents):
+        topic = vocabulary[(i % n_clusters) * topic_size:((i % n_clusters) + 1) * topic_size]
+        words = [rng.choice(topic) if rng.random() < 0.7 else rng.choice(vocabulary) for _ in range(WORDS_PER_DOCUMENT)]
+        documents.append(" ".join(words))
+    return documents
+
+
+def legacy_top_terms(c, df, tfidf_matrix, terms) -> str:
+    """Previous implementation, kept here as the reference point."""
+    idx = (df['cluster'] == c).values
+    if idx.sum() == 0:
+        return "No terms found"
+    sub = tfidf_matrix[idx].mean(axis=0).A1
+    valid_terms = [(i, term) for i, term in enumerate(terms) if "nan" not in term.lower()]
+    term_scores = {terms[i]: score for i, score in enumerate(sub)
+                   if i in [idx for idx, _ in valid_terms] and not pd.isna(score)}
+    if not term_scores:
+        return "No significant terms found"
+    top_terms_list = sorted(term_scores.items(), key=lambda x: x[1], reverse=True)[:3]
+    return ", ".join(term for term, _ in top_terms_list)
+
+
+def legacy_label_clusters(tfidf_matrix, labels, terms) -> Dict[int, Dict[str, str]]:
+    df = pd.DataFrame({'cluster': labels})
+    result = {}
+    for c in sorted(set(labels)):
+        # top_terms était appelé deux fois par cluster
+        top = legacy_top_terms(c, df, tfidf_matrix, terms)
+        result[int(c)] = {'top_terms': top, 'generated_title': generate_title(legacy_top_terms(c, df, tfidf_matrix, terms))}
+    return result
+
+
+def run(n_documents: int, n_clusters: int, skip_legacy: bool) -> None:
+    documents = make_documents(n_documents, n_clusters)
+    labels = np.arange(n_documents) % n_clusters
+
+    tfidf = TfidfVectorizer(max_features=5000, ngram_range=(1, 3), stop_words=custom_stopwords)
+    tfidf_matrix = tfidf.fit_transform(documents)
+    terms = tfidf.get_feature_names_out()
+
+    start = time.perf_counter()
+    vectorized = label_clusters(tfidf_matrix, labels, terms)
+    vectorized_time = time.perf_counter() - start
+    print(f"{n_documents:>6} documents, {len(terms)} terms, {n_clusters} clusters")
+    print(f"  label_clusters: {vectorized_time * 1000:10.2f} ms")
+
+    if skip_legacy:
+        return
+
+    start = time.perf_counter()
+    legacy = legacy_label_clusters(tfidf_matrix, labels, terms)
+    legacy_time = time.perf_counter() - start
+    same = sum(vectorized[c]['top_terms'] == legacy[c]['top_terms'] for c in legacy)
+    print(f"  legacy top_terms: {legacy_time * 1000:8.2f} ms (x{legacy_time / vectorized_time:.0f})")
+    print(f"  identical labels: {same}/{len(legacy)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 10000])
+    parser.add_argument("--clusters", type=int, default=10)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the vectorized implementation")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.clusters, args.skip_legacy)
+
+
+if __name__ == "__main__":
+    main()
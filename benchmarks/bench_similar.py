@@ -0,0 +1,138 @@
+"""
+Latency benchmark of the similar calls search.
+
+Fills an embedding store with random normalized vectors, then times
+VectorIndex.search for queries taken from the stored vectors, as
+/api/similar?reference= does. With --encode, the free-text path of
+/api/similar?q= is timed too: embed_query, then search;
+the vectors then have the dimensions of the embedding backend.
+
+Usage:
+    python -m benchmarks.bench_similar [--vectors 50000] [--dimensions 384] [--queries 200] [--encode] [--output similar.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+TARGET_MS = 50.0
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def fill_store(folder: str, n_vectors: int, dimensions: int, seed: int = 42):
+    """Create an embedding store of random normalized vectors, one reference per vector."""
+    from src.embedding_store import EmbeddingStore
+
+    rng = np.random.default_rng(seed)
+
+    def encode(texts: List[str]) -> np.ndarray:
+        vectors = rng.standard_normal((len(texts), dimensions)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    store = EmbeddingStore(folder=folder, model="bench")
+    references = [f"{i:08d}BENCH" for i in range(n_vectors)]
+    store.get_or_encode(references, [f"text {i}" for i in range(n_vectors)], encode)
+    return store, references
+
+
+def time_searches(index, references: List[str], n_queries: int, k: int) -> Dict[str, Any]:
+    """Time the search of the nearest calls of stored references."""
+    rng = np.random.default_rng(0)
+    samples = []
+    short = 0
+    for reference in rng.choice(references, size=n_queries):
+        start = time.perf_counter()
+        vector = index.vector_for_reference(reference)
+        hits = index.search(vector, k, reference)
+        samples.append(time.perf_counter() - start)
+        short += len(hits) < k
+    return {**_percentiles(samples), "short_results": short}
+
+
+async def time_text_queries(index, n_queries: int, k: int) -> Dict[str, Any]:
+    """Time embed_query followed by the search."""
+    from src.clustering import embed_query
+
+    samples = []
+    for i in range(n_queries):
+        start = time.perf_counter()
+        vector = await embed_query(f"renewable hydrogen storage {i}")
+        index.search(vector, k)
+        samples.append(time.perf_counter() - start)
+    return _percentiles(samples)
+
+
+async def run(args: argparse.Namespace, folder: str) -> Dict[str, Any]:
+    from src.clustering import embed_query, shutdown_executor
+    from src.vector_index import VectorIndex
+
+    try:
+        dimensions = args.dimensions
+        if args.encode:
+            # Chargement du backend (et du worker pour un modèle), hors mesure
+            dimensions = len(await embed_query("warm up"))
+
+        start = time.perf_counter()
+        store, references = fill_store(folder, args.vectors, dimensions)
+        index = VectorIndex(store)
+        index.refresh()
+        print(f"{args.vectors} vectors of {dimensions} dimensions ready in {time.perf_counter() - start:.1f}s")
+
+        results = {"vectors": args.vectors, "dimensions": dimensions, "k": args.k}
+        results["reference_search"] = time_searches(index, references, args.queries, args.k)
+        if args.encode:
+            results["text_search"] = await time_text_queries(index, args.queries, args.k)
+        return results
+    finally:
+        shutdown_executor()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=384, help="ignored with --encode")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--encode", action="store_true", help="also time free-text queries (hashing backend by default)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Le backend est lu à l'import de src.clustering
+    os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+
+    folder = tempfile.mkdtemp(prefix="bench_similar_")
+    try:
+        results = asyncio.run(run(args, folder))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    for name in ("reference_search", "text_search"):
+        if name in results:
+            figures = results[name]
+            verdict = "ok" if figures["p95_ms"] <= TARGET_MS else "above"
+            print(
+                f"{name:<17} p50 {figures['p50_ms']:>8} ms  p95 {figures['p95_ms']:>8} ms  "
+                f"max {figures['max_ms']:>8} ms  ({verdict} the {TARGET_MS:.0f} ms target)"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Throughput benchmark of the sweeps against a local EC API stand-in.
+
+Starts benchmarks.ec_api in its own process, then runs each scenario in a
+fresh process and working directory, pointed at the stand-in through
+EC_API_BASE_URL:
+
+    fetch_all_calls   sweep of every result page of one alert
+    detail_lookups    detail requests for --new-calls new calls of one alert
+    checker_cycle     one checker cycle over --alerts alerts, after a first
+                      cycle run before --new-calls calls were published
+
+Each run reports the requests received by the stand-in, wall time, CPU time
+and peak RSS, and can be compared with a previous report.
+
+Usage:
+    python -m benchmarks.bench_sweep [--calls 1000 10000] [--alerts 5] [--latency-ms 20] [--output sweep.json] [--compare previous.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks import ec_api
+from benchmarks.corpus import TOPICS
+
+SCENARIOS = ["fetch_all_calls", "detail_lookups", "checker_cycle"]
+CONFIG_FILES = ["config/languages.json", "config/sort.json", "config/facet.json", "config/default_alerts.json"]
+SERVER_START_TIMEOUT_SECONDS = 600
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss est en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _admin(server_url: str, path: str, method: str = "GET") -> Dict[str, Any]:
+    request = urllib.request.Request(server_url + path, method=method)
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def _request_count(server_url: str) -> int:
+    return sum(_admin(server_url, "/bench/stats")["requests"].values())
+
+
+def make_alerts(n_alerts: int) -> List[Dict[str, Any]]:
+    """Alerts on the default query, each filtering the calls of one topic."""
+    from src.query import generate_query
+
+    return [
+        {
+            "name": f"bench-{i}",
+            "interval": 60,
+            "emails": [],
+            "file_paths": {
+                "query": f"data/alerts/bench-{i}_query.json",
+                "languages": "config/languages.json",
+                "sort": "config/sort.json",
+            },
+            "message": "<strong>{title}</strong>\r\n{summary}\r\n\r\nMore information : {url}",
+            "keywords": [TOPICS[i % len(TOPICS)][0]],
+            "query": generate_query(),
+            "lastDetails": [],
+            "totalResults": 0,
+        }
+        for i in range(n_alerts)
+    ]
+
+
+async def _run(scenario: str, server_url: str, calls: int, n_alerts: int, new_calls: int) -> Dict[str, Any]:
+    from src.alert_store import load_alerts, save_alerts
+    from src.clustering import shutdown_executor
+    from src.core import CheckerState, _process_new_results, run_checker_cycle
+    from src.facet import request_facet_api
+    from src.fetch import fetch_all_calls
+
+    alerts = make_alerts(n_alerts)
+    save_alerts(alerts)
+    await request_facet_api()
+
+    # Préparation non mesurée de chaque scénario
+    result: Dict[str, Any] = {}
+    if scenario == "fetch_all_calls":
+        _admin(server_url, f"/bench/size?calls={calls}", "POST")
+    elif scenario == "detail_lookups":
+        _admin(server_url, f"/bench/size?calls={calls}", "POST")
+        items = (await fetch_all_calls(alerts[0]) or ([], 0))[0][:new_calls]
+    else:
+        _admin(server_url, f"/bench/size?calls={max(0, calls - new_calls)}", "POST")
+        state = CheckerState()
+        await run_checker_cycle(state)
+        _admin(server_url, f"/bench/size?calls={calls}", "POST")
+        state.last_checked.clear()
+
+    requests_before = _request_count(server_url)
+    rss_before = _peak_rss_mb()
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+
+    if scenario == "fetch_all_calls":
+        result["references"] = len((await fetch_all_calls(alerts[0]) or ([], 0))[0])
+    elif scenario == "detail_lookups":
+        result["lookups"] = len(items)
+        result["found"] = len(await _process_new_results(items, alerts[0]))
+    else:
+        result["alerts_checked"] = await run_checker_cycle(state)
+        result["new_details"] = sum(len(a.get("lastDetails", [])) for a in load_alerts())
+
+    result.update({
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "cpu_seconds": round(time.process_time() - cpu_start, 3),
+        "requests": _request_count(server_url) - requests_before,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_increase_mb": round(_peak_rss_mb() - rss_before, 1),
+    })
+    shutdown_executor()
+    return result
+
+
+def run_scenario(scenario: str, server_url: str, calls: int, n_alerts: int, new_calls: int) -> Dict[str, Any]:
+    """Run one scenario in a fresh working directory. Runs in a fresh process."""
+    import asyncio
+
+    source = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_sweep_")
+    try:
+        for path in CONFIG_FILES:
+            os.makedirs(os.path.join(workdir, os.path.dirname(path)), exist_ok=True)
+            shutil.copy(os.path.join(source, path), os.path.join(workdir, path))
+        os.chdir(workdir)
+        # Les URL de l'API sont lues à l'import des modules
+        os.environ["EC_API_BASE_URL"] = server_url + ec_api.BASE_PATH
+        os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+        return asyncio.run(_run(scenario, server_url, calls, n_alerts, new_calls))
+    finally:
+        os.chdir(source)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results: List[Dict[str, Any]], previous_path: str) -> None:
+    """Print the wall and CPU time ratios against a previous report."""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {(r["scenario"], r["calls"]): r for r in json.load(f)["results"]}
+    print(f"Compared with {previous_path}:")
+    for result in results:
+        before = previous.get((result["scenario"], result["calls"]))
+        if not before:
+            continue
+        ratios = [
+            f"{key} x{result[key] / before[key]:.2f}" if before[key] else f"{key} n/a"
+            for key in ("wall_seconds", "cpu_seconds", "requests")
+        ]
+        print(f"  {result['scenario']:<16} {result['calls']:>7} calls  " + "  ".join(ratios))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, nargs="+", default=[1000, 10000], help="corpus sizes")
+    parser.add_argument("--alerts", type=int, default=5, help="alerts of the checker cycle")
+    parser.add_argument("--new-calls", type=int, default=100, help="calls published before the measured cycle")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="previous JSON report to compare with")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    port = _free_port()
+    ready = context.Event()
+    server = context.Process(
+        target=ec_api.serve, args=(port, max(args.calls), args.latency_ms, args.jitter_ms, ready), daemon=True
+    )
+    server.start()
+    if not ready.wait(SERVER_START_TIMEOUT_SECONDS):
+        server.terminate()
+        raise SystemExit("The EC API stand-in did not start")
+    server_url = f"http://127.0.0.1:{port}"
+
+    results = []
+    try:
+        for calls in args.calls:
+            for scenario in args.scenarios:
+                # Un processus par scénario pour isoler la mémoire de chacun
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(
+                        run_scenario, scenario, server_url, calls, args.alerts, args.new_calls
+                    ).result()
+                result = {"scenario": scenario, "calls": calls, **result}
+                results.append(result)
+                print(
+                    f"{scenario:<16} {calls:>7} calls  {result['requests']:>6} requests  "
+                    f"wall {result['wall_seconds']:>8}s  CPU {result['cpu_seconds']:>8}s  "
+                    f"peak RSS {result['peak_rss_mb']:>7} MB"
+                )
+    finally:
+        server.terminate()
+        server.join()
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if args.output:
+        summary = {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "alerts": args.alerts,
+            "new_calls": args.new_calls,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
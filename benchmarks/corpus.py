@@ -0,0 +1,83 @@
+"""
+Synthetic call records shaped like the details saved in lastDetails.
+
+Each record is drawn from one topic, kept in the 'topic' field so that
+clusterings can be compared to the ground truth.
+"""
+import random
+from typing import Any, Dict, List
+
+TOPICS: List[List[str]] = [
+    ["hydrogen", "electrolyser", "fuel cells", "storage", "refuelling", "renewable hydrogen", "pipelines"],
+    ["batteries", "cathode", "recycling", "lithium", "cell manufacturing", "electromobility", "charging"],
+    ["quantum", "qubits", "photonics", "cryogenic", "quantum sensing", "entanglement", "error correction"],
+    ["artificial intelligence", "machine learning", "trustworthy ai", "language models", "robotics", "edge computing", "datasets"],
+    ["cybersecurity", "intrusion detection", "cryptography", "threat intelligence", "resilience", "certification", "identity"],
+    ["soil health", "agroecology", "pesticides", "biodiversity", "farmers", "nutrients", "living labs"],
+    ["climate adaptation", "flood risk", "heatwaves", "early warning", "urban resilience", "insurance", "ecosystems"],
+    ["vaccines", "antimicrobial resistance", "clinical trials", "pathogens", "diagnostics", "pandemic preparedness", "cohorts"],
+    ["ocean observation", "marine litter", "blue economy", "fisheries", "coastal", "sea floor", "aquaculture"],
+    ["cultural heritage", "museums", "digitisation", "democracy", "social sciences", "migration", "citizens"],
+]
+
+FILLER: List[str] = [
+    "the", "proposals", "should", "address", "expected", "outcome", "scope", "consortia", "demonstrate",
+    "impact", "stakeholders", "pilots", "validation", "methodologies", "deployment", "market", "uptake",
+    "cooperation", "international", "standards", "skills", "sustainability", "cost", "performance",
+]
+
+PROGRAMMES = ["Horizon Europe (HORIZON)", "Digital Europe Programme (DIGITAL)", "LIFE Programme (LIFE)"]
+
+
+def _sentence(rng: random.Random, topic: List[str], length: int) -> str:
+    words = [rng.choice(topic) if rng.random() < 0.35 else rng.choice(FILLER) for _ in range(length)]
+    return " ".join(words).capitalize() + "."
+
+
+def _description(rng: random.Random, topic: List[str], paragraphs: int) -> str:
+    items = "".join(f"<li>{_sentence(rng, topic, 14)}</li>" for _ in range(3))
+    body = "".join(f"<p>{_sentence(rng, topic, 40)} &amp; {_sentence(rng, topic, 25)}</p>" for _ in range(paragraphs))
+    return f"<p><strong>Expected Outcome:</strong></p><ul>{items}</ul><p><strong>Scope:</strong></p>{body}"
+
+
+def make_record(index: int, n_topics: int = len(TOPICS), seed: int = 42, paragraphs: int = 4) -> Dict[str, Any]:
+    """
+    Build one synthetic call record.
+
+    Args:
+        index: Position of the record, used for its reference and identifier
+        n_topics: Number of topics the records are spread over
+        seed: Seed of the generator
+        paragraphs: Number of paragraphs of the HTML description
+
+    Returns:
+        Call details with an extra 'topic' field
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    topic_id = index % min(n_topics, len(TOPICS))
+    topic = TOPICS[topic_id]
+    identifier = f"HORIZON-CL{topic_id + 1}-2025-{index:06d}"
+    return {
+        "title": [f"{rng.choice(topic).title()} {rng.choice(FILLER)} {rng.choice(topic)}"],
+        "starting_date": "15-01-2025",
+        "deadline": "17-09-2025",
+        "type": "Direct calls for proposals (issued by the EU)",
+        "status": "Open For Submission",
+        "frameworkProgramme": rng.choice(PROGRAMMES),
+        "url": f"https://ec.europa.eu/info/funding-tenders/opportunities/portal/screen/opportunities/topic-details/{identifier}",
+        "identifier": identifier,
+        "reference": f"{index:08d}TopicSearchTablePageState",
+        "summary": _sentence(rng, topic, 20),
+        "keywords": rng.sample(topic, 3),
+        "destination": "Destination " + rng.choice(topic),
+        "destinationDetails": [_description(rng, topic, 1)],
+        "callTitle": [f"Call {rng.choice(topic)}"],
+        "descriptionByte": _description(rng, topic, paragraphs),
+        "tags": rng.sample(topic, 2),
+        "topic": topic_id,
+    }
+
+
+def make_records(n_records: int, n_topics: int = len(TOPICS), seed: int = 42) -> List[Dict[str, Any]]:
+    """Build n_records synthetic call records."""
+    return [make_record(i, n_topics, seed) for i in range(n_records)]
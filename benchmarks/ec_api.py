@@ -0,0 +1,274 @@
+"""
+Local stand-in for the EC search API, serving a synthetic corpus.
+
+Implements the two endpoints used by the application, with the same
+multipart parts ('query', 'languages', 'sort') and query parameters
+(apiKey, text, pageSize, pageNumber):
+
+    POST /search-api/prod/rest/search
+    POST /search-api/prod/rest/facet
+
+Every response is delayed by a configurable latency. The visible part of the
+corpus can be changed at run time, to simulate calls published between two
+sweeps, and the server counts the requests it receives:
+
+    POST /bench/size?calls=N    GET /bench/stats
+
+Usage:
+    python -m benchmarks.ec_api [--calls 10000] [--port 8081] [--latency-ms 50]
+    EC_API_BASE_URL=http://127.0.0.1:8081/search-api/prod/rest uvicorn main:app
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import random
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.corpus import PROGRAMMES, make_record
+
+BASE_PATH = "/search-api/prod/rest"
+
+TYPES = ["1", "2", "8"]
+STATUSES = {"31094501": "Forthcoming", "31094502": "Open for submission", "31094503": "Closed"}
+PROGRAMME_CODES = {name: str(43108390 + i) for i, name in enumerate(PROGRAMMES)}
+START_DATE = "2025-01-15T00:00:00.000+0000"
+DEADLINE_DATE = "2025-09-17T17:00:00.000+0000"
+
+
+def api_result(index: int) -> Dict[str, Any]:
+    """
+    Build the search API result of the synthetic call at an index.
+
+    Args:
+        index: Position of the call in the corpus
+
+    Returns:
+        Result shaped like those of the EC search API
+    """
+    record = make_record(index, paragraphs=2)
+    identifier = record["identifier"]
+    return {
+        "reference": record["reference"],
+        "url": f"https://ec.europa.eu/info/funding-tenders/opportunities/data/topicDetails/{identifier.lower()}.json",
+        "summary": record["summary"],
+        "metadata": {
+            "identifier": [identifier],
+            "callIdentifier": [identifier.rsplit("-", 1)[0]],
+            "title": record["title"],
+            "callTitle": record["callTitle"],
+            "type": [TYPES[index % len(TYPES)]],
+            "status": [list(STATUSES)[index % len(STATUSES)]],
+            "frameworkProgramme": [PROGRAMME_CODES[record["frameworkProgramme"]]],
+            "startDate": [START_DATE],
+            "deadlineDate": [DEADLINE_DATE],
+            "keywords": record["keywords"],
+            "tags": record["tags"],
+            "destinationDetails": record["destinationDetails"],
+            "descriptionByte": [record["descriptionByte"]],
+        },
+    }
+
+
+def _values(result: Dict[str, Any], field: str) -> List[Any]:
+    value = result["metadata"].get(field, [])
+    return value if isinstance(value, list) else [value]
+
+
+def _date_ms(value: str) -> int:
+    return int(datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp() * 1000)
+
+
+def matches(clause: Dict[str, Any], result: Dict[str, Any]) -> bool:
+    """Evaluate the subset of the query language used by the application on a result."""
+    if "bool" in clause:
+        bool_clause = clause["bool"]
+        if not all(matches(c, result) for c in bool_clause.get("must", [])):
+            return False
+        if any(matches(c, result) for c in bool_clause.get("must_not", [])):
+            return False
+        should = bool_clause.get("should", [])
+        return not should or any(matches(c, result) for c in should)
+    if "terms" in clause:
+        return all(
+            any(str(v) in {str(x) for x in values} for v in _values(result, field))
+            for field, values in clause["terms"].items()
+        )
+    if "text" in clause:
+        text = clause["text"]
+        query = str(text.get("query", "")).lower()
+        return any(query in str(v).lower() for field in text.get("fields", []) for v in _values(result, field))
+    if "phrase" in clause:
+        phrase = clause["phrase"]
+        query = str(phrase.get("query", "")).lower()
+        return any(query in str(v).lower() for v in _values(result, phrase.get("field", "")))
+    if "range" in clause:
+        for field, bounds in clause["range"].items():
+            values = _values(result, field)
+            if not values:
+                return False
+            date = _date_ms(values[0])
+            if "gte" in bounds and date < bounds["gte"]:
+                return False
+            if "lte" in bounds and date > bounds["lte"]:
+                return False
+        return True
+    return True
+
+
+def _identifier_filters(query: Dict[str, Any]) -> List[str]:
+    """Identifiers required by the top-level clauses, as added for detail lookups."""
+    return [
+        clause["text"]["query"]
+        for clause in query.get("bool", {}).get("must", [])
+        if "text" in clause and clause["text"].get("fields") == ["identifier"]
+    ]
+
+
+class StandInState:
+    """Corpus, visible size, query cache and request counts of the server."""
+
+    def __init__(self, calls: int, latency_ms: float, jitter_ms: float = 0.0):
+        self.corpus = [api_result(i) for i in range(calls)]
+        self.by_identifier = {r["metadata"]["identifier"][0]: i for i, r in enumerate(self.corpus)}
+        self.size = calls
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests: Counter = Counter()
+        # Index des résultats de chaque requête, le corpus ne change pas
+        self._matches: Dict[bytes, List[int]] = {}
+
+    def matching(self, raw_query: bytes) -> List[int]:
+        """Sorted indices of the visible results of a query."""
+        indices = self._matches.get(raw_query)
+        if indices is None:
+            query = json.loads(raw_query or b"{}")
+            identifiers = _identifier_filters(query)
+            if identifiers:
+                candidates = sorted({self.by_identifier[i] for i in identifiers if i in self.by_identifier})
+            else:
+                candidates = range(len(self.corpus))
+            indices = [i for i in candidates if matches(query, self.corpus[i])]
+            self._matches[raw_query] = indices
+        return indices[:bisect.bisect_left(indices, self.size)]
+
+    async def delay(self) -> None:
+        latency = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+
+async def _read_parts(request: web.Request) -> Dict[str, bytes]:
+    parts: Dict[str, bytes] = {}
+    if not request.content_type.startswith("multipart/"):
+        return parts
+    reader = await request.multipart()
+    while True:
+        part = await reader.next()
+        if part is None:
+            return parts
+        parts[part.name] = await part.read()
+
+
+async def search(request: web.Request) -> web.Response:
+    state: StandInState = request.app["state"]
+    state.requests["search"] += 1
+    parts = await _read_parts(request)
+    if "query" not in parts:
+        return web.json_response({"error": "missing query part"}, status=400)
+    await state.delay()
+
+    page_size = int(request.query.get("pageSize", 50))
+    page_number = int(request.query.get("pageNumber", 1))
+    indices = state.matching(parts["query"])
+    page = indices[(page_number - 1) * page_size:page_number * page_size]
+    return web.json_response({
+        "totalResults": len(indices),
+        "pageNumber": page_number,
+        "pageSize": page_size,
+        "results": [state.corpus[i] for i in page],
+    })
+
+
+async def facet(request: web.Request) -> web.Response:
+    state: StandInState = request.app["state"]
+    state.requests["facet"] += 1
+    await _read_parts(request)
+    await state.delay()
+
+    def entries(mapping: Dict[str, str]) -> List[Dict[str, str]]:
+        return [{"rawValue": raw, "value": value} for raw, value in mapping.items()]
+
+    return web.json_response({"facets": [
+        {"name": "type", "values": entries({"1": "Direct calls for proposals (issued by the EU)", "2": "EU External Actions", "8": "Cascade funding"})},
+        {"name": "status", "values": entries(STATUSES)},
+        {"name": "frameworkProgramme", "values": entries({code: name for name, code in PROGRAMME_CODES.items()})},
+    ]})
+
+
+async def set_size(request: web.Request) -> web.Response:
+    state: StandInState = request.app["state"]
+    state.size = max(0, min(int(request.query["calls"]), len(state.corpus)))
+    return web.json_response({"calls": state.size})
+
+
+async def stats(request: web.Request) -> web.Response:
+    state: StandInState = request.app["state"]
+    return web.json_response({"calls": state.size, "requests": dict(state.requests)})
+
+
+def create_app(calls: int, latency_ms: float = 0.0, jitter_ms: float = 0.0) -> web.Application:
+    """Build the stand-in application over a corpus of synthetic calls."""
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app["state"] = StandInState(calls, latency_ms, jitter_ms)
+    app.router.add_post(f"{BASE_PATH}/search", search)
+    app.router.add_post(f"{BASE_PATH}/facet", facet)
+    app.router.add_post("/bench/size", set_size)
+    app.router.add_get("/bench/stats", stats)
+    return app
+
+
+async def _serve(port: int, calls: int, latency_ms: float, jitter_ms: float, ready=None) -> None:
+    runner = web.AppRunner(create_app(calls, latency_ms, jitter_ms), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    if ready is not None:
+        ready.set()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def serve(port: int, calls: int, latency_ms: float = 0.0, jitter_ms: float = 0.0, ready=None) -> None:
+    """
+    Run the stand-in until the process is stopped.
+
+    Args:
+        port: Local port to listen on
+        calls: Size of the synthetic corpus
+        latency_ms: Delay added to every response
+        jitter_ms: Maximum random delay added on top of the latency
+        ready: Optional multiprocessing event set once the server listens
+    """
+    asyncio.run(_serve(port, calls, latency_ms, jitter_ms, ready))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"EC API stand-in on http://127.0.0.1:{args.port}{BASE_PATH} ({args.calls} calls)")
+    serve(args.port, args.calls, args.latency_ms, args.jitter_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.routes import router
 from src.core import periodic_checker, weekly_facet_api_task
+from src.clustering import shutdown_executor
+from src.mail import close_connection
+from src.outbox import outbox_sender_task
 
 from contextlib import asynccontextmanager
 import asyncio
@@ -13,10 +17,14 @@ async def lifespan(app: FastAPI):
     loop = asyncio.get_event_loop()
     loop.create_task(periodic_checker())
     loop.create_task(weekly_facet_api_task())
+    loop.create_task(outbox_sender_task())
     logging.info("Background task started.")
     yield
+    shutdown_executor()
+    close_connection()
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -0,0 +1,114 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from .utils import file_version, load_json, save_json
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ALERTS_PATH: str = "config/alerts.json"
+
+# Every read-modify-write of the alerts file goes through this lock
+_lock = threading.RLock()
+
+# A mutator returns False when it did not change the alert, to skip the write
+AlertMutator = Callable[[Dict[str, Any]], Optional[bool]]
+
+
+def load_alerts() -> List[Dict[str, Any]]:
+    """
+    Load all alerts from the alerts file.
+
+    Returns:
+        List of alerts, empty if the file is missing or invalid
+    """
+    return load_json(ALERTS_PATH) or []
+
+
+def save_alerts(alerts: List[Dict[str, Any]]) -> bool:
+    """
+    Replace the content of the alerts file.
+
+    Args:
+        alerts: Complete list of alerts
+
+    Returns:
+        True if the save was successful, False otherwise
+    """
+    with _lock:
+        return save_json(alerts, ALERTS_PATH)
+
+
+def update_alert(alert_name: str, mutator: AlertMutator) -> Optional[Dict[str, Any]]:
+    """
+    Apply a change to a single alert on the latest content of the alerts file.
+
+    The file is reloaded under the lock, so changes made concurrently to the
+    other alerts (or to other fields) are not overwritten by a stale copy.
+
+    Args:
+        alert_name: Name of the alert to change
+        mutator: Function modifying the alert in place
+
+    Returns:
+        The updated alert, or None if the alert does not exist
+    """
+    with _lock:
+        alerts = load_alerts()
+        for alert in alerts:
+            if alert.get("name") == alert_name:
+                if mutator(alert) is not False:
+                    save_json(alerts, ALERTS_PATH)
+                return alert
+
+    logger.info(f"Alert '{alert_name}' not found, nothing to update.")
+    return None
+
+
+def add_alert(alert: Dict[str, Any]) -> bool:
+    """
+    Append a new alert unless an alert with the same name already exists.
+
+    Args:
+        alert: The alert to add
+
+    Returns:
+        True if the alert was added, False otherwise
+    """
+    with _lock:
+        alerts = load_alerts()
+        if any(a.get("name") == alert.get("name") for a in alerts):
+            return False
+        alerts.append(alert)
+        return save_json(alerts, ALERTS_PATH)
+
+
+def remove_alert(alert_name: str) -> bool:
+    """
+    Remove an alert, unless it is the last one.
+
+    Args:
+        alert_name: Name of the alert to remove
+
+    Returns:
+        True if the alert was removed, False otherwise
+    """
+    with _lock:
+        alerts = load_alerts()
+        remaining = [a for a in alerts if a.get("name") != alert_name]
+        # Don't delete if it's the last alert
+        if not remaining or len(remaining) == len(alerts):
+            return False
+        return save_json(remaining, ALERTS_PATH)
+
+
+def alerts_version() -> str:
+    """
+    Return a token that changes every time the alerts file is written.
+
+    Returns:
+        Version token derived from the modification time and size of the file
+    """
+    return file_version(ALERTS_PATH)
@@ -1,18 +1,47 @@
-import pandas as pd, json, html, re
-from sentence_transformers import SentenceTransformer
+import pandas as pd, json
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
+import asyncio
+import multiprocessing
 import os
+import time
+from abc import ABC, abstractmethod
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from scipy import sparse
+from scipy.optimize import linear_sum_assignment
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
-from sklearn.cluster import KMeans
 import logging
 logging.basicConfig(level=logging.INFO)
 
 from .utils import load_json, save_json
+from .alert_store import load_alerts, update_alert
+from .embedding_store import EmbeddingStore, embedding_key
+from .text import prepare_text
+from .metrics import CLUSTERING_SECONDS
+from .tracing import span, traced
 
 DATA_FOLDER = 'data'
 CONFIG_FOLDER = 'config'
+CENTROIDS_FOLDER = DATA_FOLDER + '/centroids'
+
+# Seuils de l'assignation incrémentale : au-delà, on refait un clustering complet
+DRIFT_THRESHOLD = 0.1      # baisse tolérée de la similarité moyenne aux centroïdes
+SIZE_CHANGE_RATIO = 0.5    # variation tolérée du nombre d'enregistrements
+
+# Backend d'embedding (par déploiement) et pool de processus dédié au clustering
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "transformer")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", MODEL_NAME)  # nom du modèle ou chemin local
+HASHING_DIMENSIONS = int(os.getenv("HASHING_DIMENSIONS", "256"))
+CLUSTERING_WORKERS = int(os.getenv("CLUSTERING_WORKERS", "1"))
+
+# Le pool et le backend sont créés à la demande : le modèle n'est chargé que dans le worker
+_executor: Optional[ProcessPoolExecutor] = None
+# Worker dédié aux requêtes de recherche, pour ne pas attendre derrière un clustering
+_backend: Optional["EmbeddingBackend"] = None
+_store: Optional[EmbeddingStore] = None
 
 custom_stopwords = list(ENGLISH_STOP_WORDS) + [
     # Mots vides classiques (non inclus dans ENGLISH_STOP_WORDS)
@@ -38,44 +67,462 @@ custom_stopwords = list(ENGLISH_STOP_WORDS) + [
     "ju", "selection", "partners","carry","activities", "nan"
 ]
 
+def _get_executor() -> ProcessPoolExecutor:
+    """Return the clustering process pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        # "spawn" évite de dupliquer l'état de la boucle asyncio du serveur dans le worker
+        _executor = ProcessPoolExecutor(
+            max_workers=CLUSTERING_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """Stop the clustering process pool, if it was started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class EmbeddingBackend(ABC):
+    """
+    Interface of the embedding backends.
+
+    A backend turns clean texts into L2-normalized float32 vectors. Its name
+    identifies the vector space: the embedding cache is reset when it changes.
+    """
+
+    name: str = ""
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Return one normalized float32 vector per text."""
+
+
+class TransformerBackend(EmbeddingBackend):
+    """SentenceTransformer model, from the hub or from a local path."""
+
+    def __init__(self, model: str = MODEL_NAME):
+        self.name = model
+        self._model = None
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.name)
+        return self._model.encode(texts, normalize_embeddings=True)
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Offline backend built only on scikit-learn, without any model download.
+
+    Texts are hashed into sublinear TF vectors of word unigrams and bigrams,
+    then reduced by a sparse random projection with a fixed seed. Unlike a
+    TF-IDF + TruncatedSVD fitted on each corpus, the vectors do not depend on
+    the other texts, so they can be cached and compared across runs.
+    """
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.random_projection import SparseRandomProjection
+
+        self.name = f"hashing-{dimensions}"
+        self._vectorizer = HashingVectorizer(
+            n_features=2 ** 18, ngram_range=(1, 2), alternate_sign=False,
+            norm=None, stop_words=custom_stopwords
+        )
+        # La projection ne dépend que du nombre de features : on l'ajuste une fois sur une matrice vide
+        self._projection = SparseRandomProjection(n_components=dimensions, dense_output=True, random_state=42)
+        self._projection.fit(sparse.csr_matrix((1, 2 ** 18)))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        counts = self._vectorizer.transform(texts)
+        counts.data = np.log1p(counts.data)
+        vectors = np.asarray(self._projection.transform(counts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+def create_backend(kind: str = EMBEDDING_BACKEND, model: str = EMBEDDING_MODEL) -> EmbeddingBackend:
+    """
+    Create the embedding backend selected for the deployment.
+
+    Args:
+        kind: "transformer" or "hashing"
+        model: Model name or local path, for the transformer backend
+
+    Returns:
+        The embedding backend
+    """
+    if kind == "hashing":
+        return HashingBackend()
+    if kind != "transformer":
+        logging.warning(f"Unknown embedding backend '{kind}', using the transformer backend")
+    return TransformerBackend(model)
+
+
+def get_backend() -> EmbeddingBackend:
+    """Return the embedding backend of the process, created on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+def _get_store() -> EmbeddingStore:
+    """Open the embedding cache once per worker process."""
+    global _store
+    if _store is None:
+        _store = EmbeddingStore(model=get_backend().name)
+    return _store
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return get_backend().encode(texts)
+
+
+def detail_key(detail: Dict[str, Any]) -> str:
+    """Key of a detail in the clustering results: its reference, or the hash of its clean text without one."""
+    reference = detail.get('reference')
+    return reference if reference and isinstance(reference, str) else embedding_key(None, prepare_text(detail))
+
+
+def record_keys(df: pd.DataFrame) -> List[str]:
+    """Key of each record of the DataFrame, as detail_key computes it."""
+    references = df['reference'].tolist() if 'reference' in df.columns else [None] * len(df)
+    return [
+        ref if ref and isinstance(ref, str) else embedding_key(None, text)
+        for ref, text in zip(references, df['clean_text'])
+    ]
+
+
+def embed_records(df: pd.DataFrame) -> np.ndarray:
+    """
+    Embed the clean text of each record through the embedding cache.
+
+    Args:
+        df: Records with a 'clean_text' column
+
+    Returns:
+        Normalized embeddings, one row per record
+    """
+    if 'reference' in df.columns:
+        references = [ref if isinstance(ref, str) else None for ref in df['reference']]
+    else:
+        references = [None] * len(df)
+
+    store = _get_store()
+    emb = store.get_or_encode(references, df['clean_text'].tolist(), _encode)
+    stats = store.stats()
+    logging.info(
+        f"Embedding cache: hit rate {stats['hit_rate']:.1%} ({stats['hits']} hits, {stats['misses']} misses), "
+        f"{stats['vectors']} vectors, {stats['bytes_on_disk']} bytes on disk"
+    )
+    return emb
+
+
+@traced()
 async def cluster_alert(alertName: str, n_clusters: int = 10):
     logging.info(f"Clustering alert: {alertName} with {n_clusters} clusters")
 
-    # load and flatten the data
-    df = load_details(alertName)
+    # load the records in the server process, only they cross the process boundary
+    records = load_records(alertName)
+    if not records:
+        logging.warning(f"Alert '{alertName}' has no details to cluster")
+        return
+
+    previous = load_cluster_entry(alertName)
+
+    loop = asyncio.get_running_loop()
+    started_at = time.perf_counter()
+    with span("run_clustering", records=len(records)):
+        result = await loop.run_in_executor(
+            _get_executor(), run_clustering, records, n_clusters, alertName, previous
+        )
+    CLUSTERING_SECONDS.observe(time.perf_counter() - started_at)
+
+    # Save detailed results
+    save_cluster_details(result, alertName)
+
+
+async def evict_embeddings(live_references: List[str]) -> int:
+    """Remove from the embedding cache the references no longer used by any alert."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _evict_embeddings, live_references)
+
+
+def _evict_embeddings(live_references: List[str]) -> int:
+    return _get_store().evict(live_references)
+
+
+def centroids_path(alertName: str) -> str:
+    return f"{CENTROIDS_FOLDER}/{alertName}.npz"
+
 
-    # Clean the data
-    df['clean_text'] = df.apply(build_text, axis=1)
-    # enregistrer clean_text dans un fichier txt
-    with open(f'{alertName}_clean_text.txt', 'w', encoding='utf-8') as f:
-        for text in df['clean_text'].tolist():
-            f.write(text + '\n')
+def _load_centroids(alertName: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Load the centroids and cluster ids saved by the last full clustering."""
+    path = centroids_path(alertName)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as state:
+            return state['centroids'], state['ids']
+    except Exception as e:
+        logging.warning(f"Could not read centroids {path}: {e}")
+        return None
+
+
+def _save_centroids(alertName: str, centroids: np.ndarray, ids: np.ndarray) -> None:
+    os.makedirs(CENTROIDS_FOLDER, exist_ok=True)
+    path = centroids_path(alertName)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, centroids=centroids, ids=ids)
+    os.replace(tmp_path, path)
+
+
+def _nearest_centroid(emb: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid (euclidean) of each row, in one matrix product."""
+    return np.argmax(emb @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+
+
+def _mean_similarity(emb: np.ndarray, centroids: np.ndarray, positions: np.ndarray) -> float:
+    """Mean cosine similarity between each (normalized) row and its centroid."""
+    if len(emb) == 0:
+        return 1.0
+    assigned = centroids[positions]
+    norms = np.linalg.norm(assigned, axis=1)
+    norms[norms == 0] = 1.0
+    return float(np.mean((emb * assigned).sum(axis=1) / norms))
+
+
+async def embed_query(text: str) -> np.ndarray:
+    """
+    Embed a free-text query with the embedding backend.
+
+    The hashing backend is stateless and cheap: the query is encoded in a
+    thread of the server process. A model backend encodes in the clustering
+    pool, whose workers already hold the model; the clustering queue submits
+    one job per worker at a time, so a query waits at most for the jobs
+    already running.
+    """
+    if isinstance(get_backend(), HashingBackend):
+        vectors = await asyncio.to_thread(_encode, [text])
+    else:
+        loop = asyncio.get_running_loop()
+        vectors = await loop.run_in_executor(_get_executor(), _encode, [text])
+    return np.asarray(vectors[0])
+
+
+def records_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Flatten the details of an alert into a DataFrame, one row per record."""
+    return pd.json_normalize(records)
+
+
+def add_clean_text(df: pd.DataFrame, records: List[Dict[str, Any]]) -> None:
+    """Add the 'clean_text' column: text prepared at ingest time, computed here only for older details."""
+    df['clean_text'] = [prepare_text(record) for record in records]
+
+
+def run_clustering(
+    records: List[Dict[str, Any]],
+    n_clusters: int = 10,
+    alertName: Optional[str] = None,
+    previous: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Cluster the given records. Executed in the clustering worker process.
+
+    New records are assigned to the centroids of the last full clustering when
+    possible; a full clustering is run when there are none, when the number of
+    clusters or the number of records changed too much, or when the new records
+    drift away from the centroids.
+
+    Args:
+        records: Details of the alert (lastDetails)
+        n_clusters: Requested number of clusters
+        alertName: Name of the alert, used to store its centroids
+        previous: Entry of the alert in clusters.json, if any
+
+    Returns:
+        Dictionary with the label of each record and a summary of each cluster
+    """
+    df = records_frame(records)
+    add_clean_text(df, records)
+    emb = embed_records(df)
+
+    n_clusters = min(n_clusters, len(df))
+    state = _load_centroids(alertName) if alertName and previous else None
+
+    if state is not None:
+        centroids, ids = state
+        if len(ids) == n_clusters and centroids.shape[1] == emb.shape[1]:
+            result = _assign_incremental(df, emb, centroids, ids, previous)
+            if result is not None:
+                return result
+        else:
+            logging.info(f"Cluster layout changed for '{alertName}', running a full clustering")
+
+    return _cluster_full(df, emb, n_clusters, alertName, state)
+
+
+def _assign_incremental(
+    df: pd.DataFrame,
+    emb: np.ndarray,
+    centroids: np.ndarray,
+    ids: np.ndarray,
+    previous: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Assign the records without cluster to the nearest stored centroid.
+
+    Returns:
+        The clustering result, or None when a full clustering is needed
+    """
+    fitted_records = previous.get('fitted_records', 0)
+    if not fitted_records or abs(len(df) - fitted_records) > SIZE_CHANGE_RATIO * fitted_records:
+        logging.info(f"Number of records changed from {fitted_records} to {len(df)}, running a full clustering")
+        return None
+
+    if 'cluster' in df.columns:
+        labels = pd.to_numeric(df['cluster'], errors='coerce').to_numpy(dtype=float)
+    else:
+        labels = np.full(len(df), np.nan)
+    new_mask = ~np.isin(labels, ids)
+
+    positions = _nearest_centroid(emb[new_mask], centroids)
+    new_similarity = _mean_similarity(emb[new_mask], centroids, positions)
+    baseline = previous.get('mean_similarity', new_similarity)
+    if baseline - new_similarity > DRIFT_THRESHOLD:
+        logging.info(f"New records drift from the centroids ({new_similarity:.3f} < {baseline:.3f}), running a full clustering")
+        return None
+
+    labels[new_mask] = ids[positions]
+    labels = labels.astype(int)
+    logging.info(f"Assigned {int(new_mask.sum())} new record(s) to existing clusters")
+
+    known = {c['cluster_id']: c for c in previous.get('clusters', [])}
+    clusters = []
+    for c in sorted(set(labels)):
+        cluster = dict(known.get(int(c), {'cluster_id': int(c), 'top_terms': "No terms found", 'generated_title': "Unlabeled Cluster"}))
+        cluster['size'] = int((labels == c).sum())
+        clusters.append(cluster)
+
+    return {
+        'mode': 'incremental',
+        'n_clusters': len(ids),
+        'fitted_records': fitted_records,
+        'mean_similarity': baseline,
+        'references': record_keys(df),
+        'labels': [int(label) for label in labels],
+        'clusters': clusters
+    }
 
-    # Embeddings
-    model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-    emb = model.encode(df['clean_text'].tolist(), normalize_embeddings=True)
 
-    # Clustering
+def _match_previous_ids(centroids: np.ndarray, previous_centroids: np.ndarray, previous_ids: np.ndarray) -> np.ndarray:
+    """
+    Give each new centroid the id of the most similar previous centroid so that
+    cluster ids stay stable between full clusterings. Unmatched centroids get
+    the smallest unused ids.
+    """
+    similarity = centroids @ previous_centroids.T
+    rows, cols = linear_sum_assignment(-similarity)
+
+    ids = np.full(len(centroids), -1, dtype=int)
+    ids[rows] = previous_ids[cols]
+    used = set(ids[rows].tolist())
+    free = (i for i in range(len(centroids) + len(previous_ids)) if i not in used)
+    for position in np.where(ids == -1)[0]:
+        ids[position] = next(free)
+    return ids
+
+
+def fit_clusters(
+    emb: np.ndarray,
+    n_clusters: int,
+    alertName: Optional[str],
+    state: Optional[Tuple[np.ndarray, np.ndarray]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Run KMeans on the embeddings and store the centroids of the alert.
+
+    Returns:
+        Cluster id of each record, position of its centroid, and the centroids
+    """
     kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+    positions = kmeans.fit_predict(emb)
+    centroids = kmeans.cluster_centers_.astype(np.float32)
 
-    labels = kmeans.fit_predict(emb)
-    df['cluster'] = labels
+    if state is not None and state[0].shape[1] == centroids.shape[1]:
+        ids = _match_previous_ids(centroids, *state)
+    else:
+        ids = np.arange(n_clusters)
 
-    # Keywords per cluster
+    labels = ids[positions]
+
+    if alertName:
+        _save_centroids(alertName, centroids, ids)
+    return labels, positions, centroids
+
+
+def cluster_keywords(df: pd.DataFrame, labels: np.ndarray) -> List[Dict[str, Any]]:
+    """Extract the keywords and the title of each cluster from the TF-IDF of the clean texts."""
     tfidf = TfidfVectorizer(max_features=5000, ngram_range=(1,3), stop_words=custom_stopwords)
     tfidf_matrix = tfidf.fit_transform(df['clean_text'])
     terms = tfidf.get_feature_names_out()
 
-    titles = {c: top_terms(c, df, tfidf_matrix, terms) for c in set(labels)}
-
-    # Save detailed results
-    save_cluster_details(df, labels, n_clusters, tfidf_matrix, terms, alertName)
+    cluster_labels = label_clusters(tfidf_matrix, labels, terms)
+    sizes = dict(zip(*np.unique(labels, return_counts=True)))
 
+    clusters = []
+    for c in sorted(cluster_labels):
+        clusters.append({
+            'cluster_id': c,
+            'size': int(sizes[c]),
+            **cluster_labels[c]
+        })
+    return clusters
+
+
+def _cluster_full(
+    df: pd.DataFrame,
+    emb: np.ndarray,
+    n_clusters: int,
+    alertName: Optional[str],
+    state: Optional[Tuple[np.ndarray, np.ndarray]]
+) -> Dict[str, Any]:
+    """Run KMeans and the keyword extraction on all the records."""
+    labels, positions, centroids = fit_clusters(emb, n_clusters, alertName, state)
+    clusters = cluster_keywords(df, labels)
+    return full_result(df, emb, labels, positions, centroids, clusters)
+
+
+def full_result(
+    df: pd.DataFrame,
+    emb: np.ndarray,
+    labels: np.ndarray,
+    positions: np.ndarray,
+    centroids: np.ndarray,
+    clusters: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Build the result of a full clustering, as saved by save_cluster_details."""
+    return {
+        'mode': 'full',
+        'n_clusters': len(centroids),
+        'fitted_records': len(df),
+        'mean_similarity': _mean_similarity(emb, centroids, positions),
+        'references': record_keys(df),
+        'labels': [int(label) for label in labels],
+        'clusters': clusters
+    }
 
-def save_cluster_details(df, labels, n_clusters, tfidf_matrix, terms, alertName):
-    # Créer le dossier de sortie si besoin
-    os.makedirs('testtmp', exist_ok=True)
 
+def save_cluster_details(result: Dict[str, Any], alertName: str):
     # On vérifie si le fichier existe
     if not os.path.exists(DATA_FOLDER + '/clusters.json'):
         # Créer le fichier clusters.json
@@ -96,23 +543,22 @@ def save_cluster_details(df, labels, n_clusters, tfidf_matrix, terms, alertName)
     if alert_index != -1:
         clusters.pop(alert_index)
 
+    labels = result['labels']
+    references = result['references']
+
     # Créer une nouvelle entrée pour l'alerte
     alert_data = {
-        'n_clusters': n_clusters,
-        'total_records': len(df),
-        'clusters': []
+        'n_clusters': result['n_clusters'],
+        'total_records': len(labels),
+        'mode': result['mode'],
+        'fitted_records': result['fitted_records'],
+        'mean_similarity': result['mean_similarity'],
+        'clusters': result['clusters']
     }
 
-    # Ajouter les détails par cluster
-    for c in sorted(set(labels)):
-        alert_data['clusters'].append({
-            'cluster_id': int(c),
-            'size': int(len(df[df['cluster'] == c])),
-            'top_terms': top_terms(c, df, tfidf_matrix, terms),
-            'generated_title': generate_title(top_terms(c, df, tfidf_matrix, terms))
-        })
-        logging.info(f"Cluster {c}: {alert_data['clusters'][-1]['size']} records, Top terms: {alert_data['clusters'][-1]['top_terms']}")
-        logging.info(f"Generated title: {alert_data['clusters'][-1]['generated_title']}")
+    for cluster in alert_data['clusters']:
+        logging.info(f"Cluster {cluster['cluster_id']}: {cluster['size']} records, Top terms: {cluster['top_terms']}")
+        logging.info(f"Generated title: {cluster['generated_title']}")
     
     # Ajouter les données d'alerte au tableau de clusters
     clusters.append({alertName: alert_data})
@@ -120,134 +566,106 @@ def save_cluster_details(df, labels, n_clusters, tfidf_matrix, terms, alertName)
     # Sauvegarder le fichier clusters.json
     save_json(clusters, DATA_FOLDER + '/clusters.json')
 
-    # load alerts 
-    alerts = load_json(CONFIG_FOLDER + '/alerts.json')
-    for alert in alerts:
-        if alert['name'] == alertName:
-            # Ajoute le numéro de cluster à chaque lastDetails
-            for detail in alert.get('lastDetails', []):
-                # Trouver la référence correspondante dans df
-                ref = detail.get('reference')
-                if ref is not None and 'reference' in df.columns:
-                    cluster_num = df.loc[df['reference'] == ref, 'cluster']
-                    if not cluster_num.empty:
-                        detail['cluster'] = int(cluster_num.iloc[0])
-                else:
-                    # Si pas de référence, utiliser l'index
-                    idx = alert['lastDetails'].index(detail)
-                    if idx < len(df):
-                        detail['cluster'] = int(df.iloc[idx]['cluster'])
-    
-    # sauvegarder les alertes avec le numéro de cluster
-    save_json(alerts, CONFIG_FOLDER + '/alerts.json')
+    # Ajoute le numéro de cluster aux lastDetails, seules les affectations modifiées sont écrites
+    update_alert(alertName, lambda alert: apply_cluster_labels(alert, references, labels) > 0)
+
+
+def apply_cluster_labels(alert: Dict[str, Any], references: List[Any], labels: List[int]) -> int:
+    """
+    Write the cluster label of each detail of the alert.
+
+    Args:
+        alert: Alert whose lastDetails are updated in place
+        references: Key of each clustered record (see detail_key)
+        labels: Cluster label of each clustered record
+
+    Returns:
+        Number of details whose cluster changed
+    """
+    # Index clé -> label construit une seule fois ; les détails ajoutés depuis le clustering n'ont pas de label
+    label_by_reference = dict(zip(references, labels))
+
+    changed = 0
+    for detail in alert.get('lastDetails', []):
+        label = label_by_reference.get(detail_key(detail))
+        if label is not None and detail.get('cluster') != label:
+            detail['cluster'] = label
+            changed += 1
+    return changed
+
 
+def load_cluster_entry(alertName: str) -> Optional[Dict[str, Any]]:
+    """Return the entry of the alert in clusters.json, if any."""
+    for entry in load_json(DATA_FOLDER + '/clusters.json') or []:
+        if alertName in entry:
+            return entry[alertName]
+    return None
 
 
-def load_details(alertName: str):
-    data = load_json(CONFIG_FOLDER + '/alerts.json')
+def load_records(alertName: str) -> List[Dict[str, Any]]:
+    data = load_alerts()
     records = []
     for alert in data:
         if alert['name'] == alertName:
             for ao in alert['lastDetails']:
                 records.append(ao)
-    df = pd.json_normalize(records)
-    return df
-
-def strip_html(x):
-    return re.sub('<[^<]+?>', ' ', html.unescape(x or ''))
-
-def build_text(row):
-    parts = []
-    
-    # Handle title - ensure it's a list
-    title = row.get('title', [])
-    if isinstance(title, list):
-        parts.append(" ".join(title))
-    else:
-        parts.append(str(title))
-    
-    # Add summary if exists
-    parts.append(row.get('summary', ''))
-    
-    # Handle keywords - ensure it's a list
-    keywords = row.get('keywords', [])
-    if isinstance(keywords, list):
-        parts.append(" ".join(keywords))
-    else:
-        parts.append(str(keywords))
-    
-    # Handle tags - ensure it's a list
-    tags = row.get('tags', [])
-    if isinstance(tags, list):
-        parts.append(" ".join(tags))
-    else:
-        parts.append(str(tags))
-    
-    # Add destination
-    parts.append(str(row.get('destination', '')))
-    
-    # Handle callTitle - ensure it's a list
-    call_title = row.get('callTitle', [''])
-    if isinstance(call_title, list) and len(call_title) > 0:
-        parts.append(call_title[0])
-    else:
-        parts.append(str(call_title))
-    
-    # Handle destinationDetails - peut contenir du texte riche en HTML
-    dest_details = row.get('destinationDetails')
-    if dest_details is not None:
-        if isinstance(dest_details, list) and len(dest_details) > 0:
-            # Nettoyer les balises HTML
-            cleaned_dest = " ".join([strip_html(str(detail)) for detail in dest_details])
-            parts.append(cleaned_dest)
-        elif isinstance(dest_details, str):
-            parts.append(strip_html(dest_details))
-    
-    # Handle descriptionByte
-    descriptionByte = row.get('descriptionByte')
-    if descriptionByte is not None:
-        if isinstance(descriptionByte, dict):
-            # Supprimer tout ce qui se trouve entre '<' et '>' (balises HTML)
-            cleaned_details = re.sub(r'<[^<]+?>', ' ', str(descriptionByte))
-            parts.append(cleaned_details)
-        elif isinstance(descriptionByte, list) and len(descriptionByte) > 0:
-            # Si c'est une liste, traiter chaque élément
-            parts.append(" ".join([str(detail) for detail in descriptionByte]))
+    return records
+
+def valid_terms_mask(terms: np.ndarray) -> np.ndarray:
+    """Mask of the vocabulary terms that do not contain "nan", computed once per vocabulary."""
+    return np.char.find(np.char.lower(np.asarray(terms, dtype=str)), "nan") == -1
+
+
+def label_clusters(tfidf_matrix, labels, terms, n_terms: int = 3) -> Dict[int, Dict[str, str]]:
+    """
+    Compute the top terms and the generated title of every cluster at once.
+
+    The score of a term in a cluster is its mean TF-IDF weight over the
+    documents of the cluster: all clusters are scored with a single product
+    between a normalized membership matrix and the TF-IDF matrix.
+
+    Args:
+        tfidf_matrix: Sparse TF-IDF matrix (documents x terms)
+        labels: Cluster label of each document
+        terms: Vocabulary of the TF-IDF matrix
+        n_terms: Number of terms kept per cluster
+
+    Returns:
+        Dictionary cluster id -> {'top_terms', 'generated_title'}
+    """
+    labels = np.asarray(labels)
+    cluster_ids, positions = np.unique(labels, return_inverse=True)
+    counts = np.bincount(positions)
+
+    # Matrice d'appartenance (clusters x documents) dont chaque ligne somme à 1
+    membership = sparse.csr_matrix(
+        (1.0 / counts[positions], (positions, np.arange(len(labels)))),
+        shape=(len(cluster_ids), len(labels))
+    )
+    scores = np.asarray((membership @ tfidf_matrix).todense())
+    scores = np.nan_to_num(scores, nan=0.0)
+    scores[:, ~valid_terms_mask(terms)] = 0.0
+
+    n_terms = min(n_terms, scores.shape[1])
+    if n_terms == 0:
+        return {int(c): {'top_terms': "No significant terms found", 'generated_title': "Unlabeled Cluster"} for c in cluster_ids}
+
+    # Les n meilleurs termes de chaque cluster, triés par score décroissant
+    best = np.argpartition(-scores, n_terms - 1, axis=1)[:, :n_terms]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+    result = {}
+    for row, c in enumerate(cluster_ids):
+        selected = [terms[i] for i, score in zip(best[row], best_scores[row]) if score > 0]
+        if not selected:
+            logging.warning(f"Cluster {c}: Aucun terme significatif trouvé après filtrage")
+            top = "No significant terms found"
         else:
-            parts.append(str(descriptionByte))
-    
-    return strip_html(" ".join(parts))
-
-def top_terms(c, df, tfidf_matrix, terms):
-    idx = (df['cluster'] == c).values
-    if idx.sum() == 0:
-        logging.warning(f"Cluster {c}: Aucun élément trouvé dans le cluster")
-        return "No terms found"
-    
-    # Calcul de la moyenne des vecteurs TF-IDF pour ce cluster
-    sub = tfidf_matrix[idx].mean(axis=0).A1
-    
-    # Filtrer explicitement les termes contenant "nan" avant de créer term_scores
-    valid_terms = [(i, term) for i, term in enumerate(terms) 
-                  if "nan" not in term.lower()]
-    
-    # Créer un dictionnaire terme -> score pour les termes valides uniquement
-    term_scores = {terms[i]: score for i, score in enumerate(sub) 
-                   if i in [idx for idx, _ in valid_terms] and not pd.isna(score)}
-    
-    # Si tous les termes sont nuls ou 'nan', retourner une indication claire
-    if not term_scores:
-        logging.warning(f"Cluster {c}: Aucun terme significatif trouvé après filtrage")
-        return "No significant terms found"
-    
-    # Trier par score et prendre les 3 meilleurs
-    top_terms_list = sorted(term_scores.items(), key=lambda x: x[1], reverse=True)[:3]
-
-    # Extraire seulement les termes (pas les scores)
-    top_terms = [term for term, _ in top_terms_list]
-    
-    result = ", ".join(top_terms)
-    
+            top = ", ".join(selected)
+        result[int(c)] = {'top_terms': top, 'generated_title': generate_title(top)}
     return result
 
 def generate_title(top_terms):
@@ -300,18 +718,8 @@ def generate_title(top_terms):
     except:
         return "Unlabeled Cluster"
 
-# Custom JSON encoder to handle numpy types
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (np.integer, np.int64)):
-            return int(obj)
-        elif isinstance(obj, (np.floating, np.float64)):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return json.JSONEncoder.default(self, obj)
-
 if __name__ == "__main__":
     # Example usage
-    cluster_alert("test", n_clusters=10)
+    asyncio.run(cluster_alert("test", n_clusters=10))
+    shutdown_executor()
     print("Clustering completed.")
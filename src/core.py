@@ -2,25 +2,32 @@ import asyncio
 import json
 import logging
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from functools import partial
 from typing import Dict, List, Optional, Set, Any, Tuple
 
+from .request import EC_API_BASE_URL
 from .fetch import fetch_all_calls, get_detailed_info, get_total_results
-from .mail import send_email_alert
-from .utils import load_json, save_json
+from .digest import add_detection, flush_digests
+from .alert_store import ALERTS_PATH, load_alerts, save_alerts, update_alert
+from .utils import save_json
 from .facet import request_facet_api
-from .clustering import cluster_alert
+from .clustering import CLUSTERING_WORKERS, centroids_path, cluster_alert, detail_key, evict_embeddings
+from .jobs import JobQueue
+from .metrics import ALERT_CHECK_SECONDS, SCHEDULER_LAG_SECONDS
+from .tracing import span, traced
+from .query import query_digest
 
 # Configuration constants
 CONFIG_PATH = "config/config.json"
-ALERTS_PATH = "config/alerts.json"
 DEFAULT_ALERTS_PATH = "config/default_alerts.json"
 DATAFOLDER: str = "data"
 CONFIGFOLDER: str = "config"
 ALERTS_SUBFOLDER = f"{DATAFOLDER}/alerts"
 
 # API constants
-EC_API_URL = "https://api.tech.ec.europa.eu/search-api/prod/rest/search"
+EC_API_URL = f"{EC_API_BASE_URL}/search"
 EC_API_PARAMS = {"apiKey": "SEDIA", "text": "***"}
 
 # Timing constants
@@ -31,67 +38,81 @@ ERROR_RETRY_SECONDS = 60
 # Max number of details to keep
 MAX_SAVED_DETAILS = 300
 
+# Background clustering jobs, one pending job per alert
+clustering_queue = JobQueue("clustering", workers=CLUSTERING_WORKERS)
+EVICT_EMBEDDINGS_JOB = "__evict_embeddings__"
+
+# Background total count refresh after an alert is saved, one pending job per alert
+count_queue = JobQueue("counts", workers=2)
+
 WEEKLY_FACET_FILE = "data/facet.json"
 WEEKLY_FACET_API_INTERVAL_SECONDS = 7 * 24 * 60 * 60  # 1 semaine
 
 
-async def periodic_checker() -> None:
-    """
-    Continuously check for new results for each alert based on its frequency.
-    
-    This function:
-    - Dynamically picks up new alerts added to the config file
-    - Tracks when each alert was last checked
-    - Creates necessary directories and files if they don't exist
-    - Handles errors gracefully with logging
+class CheckerState:
+    """State kept by the checker from one cycle to the next."""
+
+    def __init__(self):
+        # Keep track of the last time each alert was checked
+        self.last_checked: Dict[str, datetime] = {}
+        # Keep track of the alerts we know about
+        self.known_alerts: Set[str] = set()
+        # References present in lastDetails at the end of the previous pass
+        self.last_references: Optional[Set[str]] = None
+
+
+async def run_checker_cycle(state: CheckerState) -> int:
     """
-    # Keep track of the last time each alert was checked
-    last_checked: Dict[str, datetime] = {}
-    # Keep track of the alerts we know about
-    known_alerts: Set[str] = set()
-    
-    # Create alerts directory if it doesn't exist
-    os.makedirs(ALERTS_SUBFOLDER, exist_ok=True)
-    
-    while True:
-        try:
-            # check if ALERTS_PATH exists else copy the default one
-            if not os.path.exists(ALERTS_PATH):
-                logging.info(f"Le fichier {ALERTS_PATH} n'existe pas, on le copie depuis {DEFAULT_ALERTS_PATH}")
-                os.makedirs(os.path.dirname(ALERTS_PATH), exist_ok=True)
-                with open(DEFAULT_ALERTS_PATH, "r", encoding="utf-8") as f:
-                    default_alerts = json.load(f)
-                save_json(default_alerts, ALERTS_PATH)
-
-            # Load the alerts from the config file
-            alerts = load_json(ALERTS_PATH)
-            current_time = datetime.now()
-            
-            for alert in alerts:
-                alert_name = alert.get("name", "unnamed")
-                interval_minutes = alert.get("interval", DEFAULT_CHECK_INTERVAL_MINUTES)
-                
-                # Add to known alerts
-                known_alerts.add(alert_name)
-                
-                # Check if it's time to process this alert
-                if _should_check_alert(alert_name, current_time, last_checked, interval_minutes):
-                    # check if the alert still exists
-                    if _check_deleted(alert_name):
-                        continue
+    Run one pass of the checker: check the alerts that are due, send the digests and clean up.
 
+    Args:
+        state: State of the checker, updated in place
 
+    Returns:
+        Number of alerts checked
+    """
+    with span("checker.cycle") as cycle:
+        # check if ALERTS_PATH exists else copy the default one
+        if not os.path.exists(ALERTS_PATH):
+            logging.info(f"Le fichier {ALERTS_PATH} n'existe pas, on le copie depuis {DEFAULT_ALERTS_PATH}")
+            os.makedirs(os.path.dirname(ALERTS_PATH), exist_ok=True)
+            with open(DEFAULT_ALERTS_PATH, "r", encoding="utf-8") as f:
+                default_alerts = json.load(f)
+            save_alerts(default_alerts)
+
+        # Load the alerts from the config file
+        alerts = load_alerts()
+        current_time = datetime.now()
+        checked_alerts = 0
+
+        for alert in alerts:
+            alert_name = alert.get("name", "unnamed")
+            interval_minutes = alert.get("interval", DEFAULT_CHECK_INTERVAL_MINUTES)
+
+            # Add to known alerts
+            state.known_alerts.add(alert_name)
+
+            # Check if it's time to process this alert
+            if _should_check_alert(alert_name, current_time, state.last_checked, interval_minutes):
+                # check if the alert still exists
+                if _check_deleted(alert_name):
+                    continue
+
+                checked_alerts += 1
+                with span("check_alert", alert=alert_name):
                     logging.info(f"Checking alert '{alert_name}'")
-                    
+                    check_started = time.perf_counter()
+                    if alert_name in state.last_checked:
+                        due_at = state.last_checked[alert_name] + timedelta(minutes=interval_minutes)
+                        SCHEDULER_LAG_SECONDS.observe(max(0.0, (datetime.now() - due_at).total_seconds()))
+
                     # Ensure query file exists
                     change_query = _ensure_query_file_exists(alert)
-                    
+
                     try:
-                        # Update the total results count
-                        total_results = await get_total_results(alert)
-                        alert["totalResults"] = total_results
-                        
-                        comparison = await check_new_results(alert)
+                        comparison, total_results = await check_new_results(alert)
+                        # Le nombre total de résultats est donné par la première page de fetch_all_calls
+                        _update_alert_total_results(alert_name, total_results)
                         if comparison and change_query:
 
                             if (_check_deleted(alert_name) or _check_updated(alert_name)):
@@ -104,13 +125,13 @@ async def periodic_checker() -> None:
                                 continue
 
                             if(details and not _check_updated(alert_name)):
+                                # La notification est enregistrée avant la détection, l'envoi est fait par l'outbox
+                                add_detection(alert, details)
                                 # Update and save alert with new details
-                                _update_and_save_alert(alerts, alert_name, details)
-                                email_subject = f"Nouveaux résultats : {alert_name}"
-                                send_email_alert(details, alert.get("message"), alert.get("emails"), email_subject)
-
-                            # Save the updated alert with totalResults
-                            _update_alert_total_results(alerts, alert_name, total_results)
+                                with span("save_alert"):
+                                    updated_alert = _update_and_save_alert(alert_name, details)
+                                if updated_alert:
+                                    alert["lastDetails"] = updated_alert["lastDetails"]
 
                         # Vérifie que tous les détails dans lastDetails ont un champ "cluster"
                         last_details = alert.get("lastDetails", [])
@@ -119,22 +140,63 @@ async def periodic_checker() -> None:
                             logging.info(f"Démarrage du clustering en arrière-plan pour l'alerte '{alert_name}'")
                             size = len(last_details)
                             nb_clusters = min(max(1, size // 10), 10)
-                            # Lancer le clustering dans une tâche de fond pour ne pas bloquer le serveur
-                            asyncio.create_task(cluster_alert(alert_name, nb_clusters))
+                            # Un seul clustering en attente par alerte, le calcul se fait dans le pool de processus
+                            clustering_queue.submit(alert_name, partial(cluster_alert, alert_name, nb_clusters))
+
 
-                        
                     except Exception as e:
                         logging.error(f"Error checking alert '{alert_name}': {str(e)}", exc_info=True)
-                    
+                    finally:
+                        ALERT_CHECK_SECONDS.labels(alert_name).observe(time.perf_counter() - check_started)
+
                     _check_updated(alert_name)
 
                     # Update the last checked time
-                    last_checked[alert_name] = current_time
-            
-            # Clean up any alerts that no longer exist
-            _cleanup_removed_alerts(last_checked, known_alerts)
-            known_alerts.clear()
-            
+                    state.last_checked[alert_name] = current_time
+
+        # Un seul email par destinataire pour les alertes détectées, selon son mode de digest
+        flush_digests()
+
+        # Clean up any alerts that no longer exist
+        _cleanup_removed_alerts(state.last_checked, state.known_alerts)
+        state.known_alerts.clear()
+
+        # Retirer du cache d'embeddings les appels qui ne sont plus suivis par aucune alerte
+        live_references = _collect_references(load_alerts())
+        if live_references != state.last_references:
+            clustering_queue.submit(EVICT_EMBEDDINGS_JOB, partial(evict_embeddings, sorted(live_references)))
+            state.last_references = live_references
+
+        # Ne garder que les cycles qui ont vérifié au moins une alerte
+        if not checked_alerts:
+            cycle.discard()
+    return checked_alerts
+
+
+async def periodic_checker() -> None:
+    """
+    Continuously check for new results for each alert based on its frequency.
+    
+    This function:
+    - Dynamically picks up new alerts added to the config file
+    - Tracks when each alert was last checked
+    - Creates necessary directories and files if they don't exist
+    - Handles errors gracefully with logging
+    """
+    state = CheckerState()
+    
+    # Create alerts directory if it doesn't exist
+    os.makedirs(ALERTS_SUBFOLDER, exist_ok=True)
+
+    # Relancer les comptages interrompus par un redémarrage
+    for alert in load_alerts():
+        if alert.get("countPending"):
+            schedule_total_results(alert.get("name"))
+    
+    while True:
+        try:
+            await run_checker_cycle(state)
+
             # Sleep before checking again
             await asyncio.sleep(CHECKER_SLEEP_SECONDS)
         
@@ -152,17 +214,18 @@ def _check_updated(alert_name):
     Returns:
         True if the alert has been updated, False otherwise
     """
-    alerts = load_json(ALERTS_PATH)
+    alerts = load_alerts()
     if any( a.get("updated") for a in alerts):
         # updated to false
-        for i, alert in enumerate(alerts):
-            if alert.get("name") == alert_name:
-                alerts[i]["updated"] = False
-                save_json(alerts, ALERTS_PATH)
-                logging.info(f"L'alerte '{alert_name}' a été mise à jour.")
+        if update_alert(alert_name, _clear_updated_flag):
+            logging.info(f"L'alerte '{alert_name}' a été mise à jour.")
         return True
     return False
 
+
+def _clear_updated_flag(alert: Dict[str, Any]) -> None:
+    alert["updated"] = False
+
 def _check_deleted(alert_name):
     """
     Check if the alert has been deleted.
@@ -173,7 +236,7 @@ def _check_deleted(alert_name):
     Returns:
         True if the alert has been deleted, False otherwise
     """
-    alerts = load_json(ALERTS_PATH)
+    alerts = load_alerts()
     
     if not any(a.get("name") == alert_name for a in alerts):
         logging.info(f"L'alerte '{alert_name}' a été supprimée, on skip la suite.")
@@ -215,7 +278,7 @@ def _ensure_query_file_exists(alert: Dict[str, Any]) -> bool:
             try:
                 with open(file_path, "r", encoding="utf-8") as f:
                     query_in_file = json.load(f)
-                if json.dumps(query_in_file, sort_keys=True) != json.dumps(query_in_alert, sort_keys=True):
+                if query_digest(query_in_file) != query_digest(query_in_alert):
                     logging.info(f"Query in {file_path} differs from alert. Updating file.")
                     with open(file_path, "w", encoding="utf-8") as f:
                         json.dump(query_in_alert, f, indent=4, ensure_ascii=False)
@@ -230,16 +293,18 @@ def _ensure_query_file_exists(alert: Dict[str, Any]) -> bool:
     return False
 
 
-def _update_and_save_alert(alerts: List[Dict[str, Any]], alert_name: str, details: List[Dict[str, Any]]) -> None:
-    """Update an alert with new details and save all alerts to config."""
-    # Find and update the alert in the list
-    for i, alert in enumerate(alerts):
-        if alert.get("name") == alert_name:
-            alerts[i] = save_details(details, alert)
-            break
-    
-    # Save the updated alerts configuration
-    save_json(alerts, ALERTS_PATH)
+def _update_and_save_alert(alert_name: str, details: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Update an alert with new details and save it to config."""
+    return update_alert(alert_name, lambda alert: save_details(details, alert) is not None)
+
+
+def _collect_references(alerts: List[Dict[str, Any]]) -> Set[str]:
+    """Return the embedding keys of every detail kept by the alerts: its reference, or its text hash without one."""
+    return {
+        detail_key(detail)
+        for alert in alerts
+        for detail in alert.get("lastDetails", [])
+    }
 
 
 def _cleanup_removed_alerts(last_checked: Dict[str, datetime], known_alerts: Set[str]) -> None:
@@ -255,6 +320,9 @@ def _cleanup_removed_alerts(last_checked: Dict[str, datetime], known_alerts: Set
             file_path_query = f"{ALERTS_SUBFOLDER}/{alert_name}_query.json"
             if os.path.exists(file_path_query):
                 os.remove(file_path_query)
+            file_path_centroids = centroids_path(alert_name)
+            if os.path.exists(file_path_centroids):
+                os.remove(file_path_centroids)
 
 
 def save_details(details: List[Dict[str, Any]], alert: Dict[str, Any]) -> Dict[str, Any]:
@@ -328,7 +396,8 @@ def load_previous_results(alert: Dict[str, Any]) -> List[Dict[str, Any]]:
         return []
 
 
-async def check_new_results(alert: Dict[str, Any]) -> List[Dict[str, Any]]:
+@traced()
+async def check_new_results(alert: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
     """
     Check for new results for a given alert.
     
@@ -336,14 +405,17 @@ async def check_new_results(alert: Dict[str, Any]) -> List[Dict[str, Any]]:
         alert: The alert configuration
     
     Returns:
-        List of new detailed results if any, otherwise empty list
+        List of new detailed results if any, otherwise empty list, and the
+        total results count, None if the sweep failed
     """
-    current = await fetch_all_calls(alert) 
-    previous = load_previous_results(alert)
-    comparison = compare_results(previous, current)
+    fetched = await fetch_all_calls(alert)
+    current, total_results = fetched if fetched is not None else (None, None)
+    with span("compare_results"):
+        previous = load_previous_results(alert)
+        comparison = compare_results(previous, current)
 
     # Vérifier si l'alerte existe toujours après la récupération des résultats
-    alerts = load_json(ALERTS_PATH)
+    alerts = load_alerts()
     if not any(a.get("name") == alert.get("name") for a in alerts):
         logging.info(f"L'alerte '{alert.get('name')}' a été supprimée pendant la récupération, on skip la suite.")
         # Vérifier que les fichiers liés à l'alerte sont supprimés
@@ -351,19 +423,20 @@ async def check_new_results(alert: Dict[str, Any]) -> List[Dict[str, Any]]:
             os.remove(f"{ALERTS_SUBFOLDER}/{alert.get('name')}.json")
         if os.path.exists(f"{ALERTS_SUBFOLDER}/{alert.get('name')}.json"):
             os.remove(f"{ALERTS_SUBFOLDER}/{alert.get('name')}_query.json")
-        return []
+        return [], total_results
     else:
         file_path = f"{ALERTS_SUBFOLDER}/{alert.get('name')}.json"
         save_json(current, file_path)
 
     if comparison["new"] and current:
         logging.info(f"{len(comparison['new'])} new result(s) detected.")
-        return comparison["new"]
+        return comparison["new"], total_results
     else:
         logging.info("✅ No new results.")
-        return []
+        return [], total_results
 
 
+@traced("process_new_results")
 async def _process_new_results(new_items: List[Dict[str, Any]], alert: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Process new results by getting detailed information and sending alerts.
@@ -407,15 +480,73 @@ async def weekly_facet_api_task():
         await asyncio.sleep(WEEKLY_FACET_API_INTERVAL_SECONDS)
 
 
-def _update_alert_total_results(alerts: List[Dict[str, Any]], alert_name: str, total_results: int) -> None:
-    """Update an alert with the total results count and save all alerts to config."""
-    updated = False
-    for i, alert in enumerate(alerts):
-        if alert.get("name") == alert_name:
-            alerts[i]["totalResults"] = total_results
-            updated = True
-            break
-    
-    if updated:
-        # Save the updated alerts configuration
-        save_json(alerts, ALERTS_PATH)
+def schedule_total_results(alert_name: str) -> bool:
+    """
+    Queue the refresh of the total results count of an alert.
+
+    Repeated saves of the same alert are merged into a single job, which
+    uses the alert as stored when it starts.
+
+    Args:
+        alert_name: Name of the alert
+
+    Returns:
+        True if a new job was queued, False if merged with a pending one
+    """
+    return count_queue.submit(alert_name, partial(refresh_total_results, alert_name))
+
+
+async def refresh_total_results(alert_name: str) -> Optional[int]:
+    """
+    Fetch the total results count of an alert and store it.
+
+    When the count fails, the previous total is kept and the alert is
+    marked with countError instead of being stored as 0 results.
+
+    Args:
+        alert_name: Name of the alert
+
+    Returns:
+        The total results count, or None if the alert no longer exists or the count failed
+    """
+    alert = next((a for a in load_alerts() if a.get("name") == alert_name), None)
+    if alert is None:
+        return None
+
+    total_results = await get_total_results(alert)
+
+    def set_total(stored_alert: Dict[str, Any]) -> None:
+        # Un échec n'est pas un total nul : l'ancien total est conservé
+        if total_results is not None:
+            stored_alert["totalResults"] = total_results
+        stored_alert["countPending"] = False
+        stored_alert["countError"] = total_results is None
+
+    update_alert(alert_name, set_total)
+    return total_results
+
+
+def _update_alert_total_results(alert_name: str, total_results: Optional[int]) -> None:
+    """
+    Update an alert with the total results count of its last sweep and save it to config.
+
+    A failed sweep (None) keeps the previous total and marks the alert with
+    countError, as a failed count refresh does. The file is only written
+    when something changed.
+    """
+    if total_results is None:
+        logging.warning(f"Sweep of alert '{alert_name}' failed, keeping its previous total results")
+
+    def set_total(alert: Dict[str, Any]) -> bool:
+        # Un comptage en attente (requête modifiée pendant le balayage) fixera le total
+        if alert.get("countPending"):
+            return False
+        count_error = total_results is None
+        if bool(alert.get("countError")) == count_error and (count_error or alert.get("totalResults") == total_results):
+            return False
+        if not count_error:
+            alert["totalResults"] = total_results
+        alert["countError"] = count_error
+        return True
+
+    update_alert(alert_name, set_total)
@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+import time
+from html import escape
+from typing import Any, Dict, List, Optional, Tuple
+
+from .mail import format_alert_message, limit_email_body
+from .outbox import enqueue_notification
+from .tracing import traced
+from .utils import load_json, save_json
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIGEST_CONFIG_PATH: str = "config/digest.json"
+DIGEST_PATH: str = "data/digest.json"
+
+# Fenêtre de regroupement de chaque mode, en secondes
+DIGEST_WINDOWS: Dict[str, int] = {
+    "immediate": 0,
+    "hourly": 60 * 60,
+    "daily": 24 * 60 * 60,
+}
+DEFAULT_DIGEST_MODE: str = "immediate"
+
+SUBJECT_PREFIX: str = "Nouveaux résultats"
+
+# Every read-modify-write of the digest file goes through this lock
+_lock = threading.RLock()
+
+
+def load_digest_config() -> Dict[str, Any]:
+    """
+    Load the digest mode of the recipients.
+
+    The file looks like {"default": "immediate", "recipients": {"a@b.eu": "daily"}}.
+
+    Returns:
+        The digest configuration, every recipient immediate if the file is missing
+    """
+    config = load_json(DIGEST_CONFIG_PATH) if os.path.exists(DIGEST_CONFIG_PATH) else None
+    return config or {"default": DEFAULT_DIGEST_MODE, "recipients": {}}
+
+
+def digest_window(recipient: str, config: Dict[str, Any]) -> int:
+    """
+    Return the grouping window of a recipient, in seconds.
+
+    Args:
+        recipient: Email address
+        config: Digest configuration
+
+    Returns:
+        Window of the recipient's mode, 0 for unknown modes
+    """
+    mode = config.get("recipients", {}).get(recipient, config.get("default", DEFAULT_DIGEST_MODE))
+    if mode not in DIGEST_WINDOWS:
+        logger.warning(f"Unknown digest mode '{mode}' for {recipient}, sending immediately.")
+    return DIGEST_WINDOWS.get(mode, 0)
+
+
+def _load_digest() -> Dict[str, Any]:
+    data = load_json(DIGEST_PATH) if os.path.exists(DIGEST_PATH) else None
+    return data or {"entries": [], "last_sent": {}}
+
+
+def _save_digest(data: Dict[str, Any]) -> bool:
+    # Écriture dans un fichier temporaire puis remplacement atomique
+    tmp_path = f"{DIGEST_PATH}.tmp"
+    if not save_json(data, tmp_path):
+        return False
+    os.replace(tmp_path, DIGEST_PATH)
+    return True
+
+
+def add_detection(alert: Dict[str, Any], details: List[Dict[str, Any]]) -> bool:
+    """
+    Record new details of an alert until the digest of each recipient is sent.
+
+    Each call is rendered with the alert template now, so the digest only
+    keeps the HTML and the reference of the calls.
+
+    Args:
+        alert: The alert configuration
+        details: New details of the alert
+
+    Returns:
+        True if the detection was saved, False otherwise
+    """
+    recipients = alert.get("emails") or []
+    if not recipients or not details:
+        return False
+
+    template = alert.get("message") or ""
+    entry = {
+        "alert": alert.get("name", "unnamed"),
+        "recipients": list(recipients),
+        "calls": [
+            {"reference": str(detail.get("reference") or ""), "html": format_alert_message(detail, template)}
+            for detail in details
+        ],
+        "created_at": time.time(),
+    }
+    with _lock:
+        data = _load_digest()
+        data["entries"].append(entry)
+        return _save_digest(data)
+
+
+def render_digest(entries: List[Dict[str, Any]]) -> Tuple[str, str, List[str]]:
+    """
+    Render one email with a section per alert.
+
+    A call matched by several alerts is only listed in the first section.
+    The body size limit is applied to each section.
+
+    Args:
+        entries: Pending detections of a recipient, oldest first
+
+    Returns:
+        Tuple (subject, body, references)
+    """
+    sections: Dict[str, List[Dict[str, str]]] = {}
+    seen = set()
+    for entry in entries:
+        for call in entry["calls"]:
+            reference = call.get("reference")
+            if reference and reference in seen:
+                continue
+            seen.add(reference)
+            sections.setdefault(entry["alert"], []).append(call)
+
+    total = sum(len(calls) for calls in sections.values())
+    if len(sections) == 1:
+        subject = f"{SUBJECT_PREFIX} : {next(iter(sections))} ({total})"
+    else:
+        subject = f"{SUBJECT_PREFIX} : {len(sections)} alertes ({total})"
+
+    body = ""
+    for alert_name, calls in sections.items():
+        if len(sections) > 1:
+            body += f"<h2>{escape(alert_name)} ({len(calls)})</h2>"
+        body += limit_email_body(call["html"] for call in calls)
+
+    return subject, body, sorted(r for r in seen if r)
+
+
+@traced()
+def flush_digests(now: Optional[float] = None) -> int:
+    """
+    Move the due digests to the outbox, one message per recipient.
+
+    A digest is due when the window of the recipient has elapsed since its
+    last digest (or since its oldest pending detection).
+
+    Args:
+        now: Current time, defaults to time.time()
+
+    Returns:
+        Number of messages added to the outbox
+    """
+    now = time.time() if now is None else now
+    config = load_digest_config()
+    queued = 0
+
+    with _lock:
+        data = _load_digest()
+        entries = data["entries"]
+        recipients = sorted({r for entry in entries for r in entry["recipients"]})
+
+        for recipient in recipients:
+            pending = [entry for entry in entries if recipient in entry["recipients"]]
+            start = data["last_sent"].get(recipient, min(entry["created_at"] for entry in pending))
+            if now - start < digest_window(recipient, config):
+                continue
+
+            subject, body, references = render_digest(pending)
+            # La fenêtre fait partie de la clé : un redémarrage avant la sauvegarde ne crée pas de doublon,
+            # mais un digest ultérieur avec les mêmes appels est bien envoyé
+            detection = f"{start:.6f}"
+            if enqueue_notification(f"digest:{recipient}", [recipient], subject, body, references, detection) is None:
+                continue
+
+            for entry in pending:
+                entry["recipients"].remove(recipient)
+            data["last_sent"][recipient] = now
+            queued += 1
+
+        if queued:
+            data["entries"] = [entry for entry in entries if entry["recipients"]]
+            _save_digest(data)
+
+    if queued:
+        logger.info(f"{queued} digest(s) added to the outbox.")
+    return queued
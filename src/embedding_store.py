@@ -0,0 +1,262 @@
+import hashlib
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .utils import load_json, save_json
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Storage configuration
+EMBEDDINGS_FOLDER: str = "data/embeddings"
+MATRIX_FILENAME: str = "vectors.f32"
+INDEX_FILENAME: str = "index.json"
+LOCK_FILENAME: str = ".lock"
+
+# Compact the matrix only when at least this share of the rows is orphaned
+EVICTION_MIN_RATIO: float = 0.1
+
+# Prefix of the keys of texts without a reference, keyed by their hash
+TEXT_KEY_PREFIX: str = "text:"
+
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+
+def text_hash(text: str) -> str:
+    """
+    Compute the hash identifying a cleaned text in the store.
+
+    Args:
+        text: Text given to the embedding model
+
+    Returns:
+        Hexadecimal digest of the text
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def embedding_key(reference: Optional[str], text: str) -> str:
+    """
+    Return the key under which a text is kept in the store.
+
+    Args:
+        reference: Reference of the call (None when unknown)
+        text: Cleaned text of the call
+
+    Returns:
+        The reference, or the hash of the text for records without one,
+        so that their vectors are kept alive by eviction like the others
+    """
+    return reference or TEXT_KEY_PREFIX + text_hash(text)
+
+
+class EmbeddingStore:
+    """
+    On-disk embedding cache shared by all alerts.
+
+    Vectors are stored in a single float32 matrix read through a memory map,
+    and an index maps each text hash to its row and each reference to the hash
+    of its current text. A text is only embedded when its hash is unseen.
+    """
+
+    def __init__(self, folder: str = EMBEDDINGS_FOLDER, model: str = ""):
+        self.folder = folder
+        self.model = model
+        self.matrix_path = os.path.join(folder, MATRIX_FILENAME)
+        self.index_path = os.path.join(folder, INDEX_FILENAME)
+        self.lock_path = os.path.join(folder, LOCK_FILENAME)
+        self.hits = 0
+        self.misses = 0
+        self._index: Dict[str, Any] = self._empty_index()
+
+    def _empty_index(self) -> Dict[str, Any]:
+        # "generation" change à chaque compaction : les numéros de ligne ne sont alors plus valables
+        return {"model": self.model, "dim": 0, "generation": 0, "rows": {}, "references": {}}
+
+    @contextmanager
+    def _locked(self, shared: bool = False) -> Iterator[None]:
+        """Hold the store lock and reload the index written by other workers."""
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                self._load_index(reset=not shared)
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_index(self, reset: bool = True) -> None:
+        index = load_json(self.index_path) if os.path.exists(self.index_path) else None
+        if not index or index.get("model") != self.model:
+            if not reset:
+                self._index = self._empty_index()
+                return
+            if index:
+                logger.info(f"Embedding store built with another model, resetting {self.folder}")
+            self._reset()
+            return
+        self._index = index
+
+    def _reset(self) -> None:
+        self._index = self._empty_index()
+        if os.path.exists(self.matrix_path):
+            os.remove(self.matrix_path)
+
+    def _save_index(self) -> None:
+        save_json(self._index, self.index_path)
+
+    def _row_count(self) -> int:
+        dim = self._index["dim"]
+        if not dim or not os.path.exists(self.matrix_path):
+            return 0
+        return os.path.getsize(self.matrix_path) // (dim * 4)
+
+    def matrix(self) -> np.ndarray:
+        """Return the whole matrix as a read-only memory map (no copy)."""
+        rows = self._row_count()
+        if rows == 0:
+            return np.zeros((0, self._index["dim"]), dtype=np.float32)
+        return np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self._index["dim"]))
+
+    def _append(self, vectors: np.ndarray) -> int:
+        """Append vectors at the end of the matrix and return the first new row."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not self._index["dim"]:
+            self._index["dim"] = int(vectors.shape[1])
+        first_row = self._row_count()
+        # Les vecteurs sont écrits avant l'index : l'index ne pointe jamais vers des lignes absentes
+        with open(self.matrix_path, "ab") as f:
+            f.write(vectors.tobytes())
+        return first_row
+
+    def get_or_encode(self, references: List[Optional[str]], texts: List[str], encode: EncodeFn) -> np.ndarray:
+        """
+        Return the embeddings of the given texts, encoding only the unseen ones.
+
+        Args:
+            references: Reference of each text (None when unknown)
+            texts: Cleaned texts to embed
+            encode: Function embedding a list of texts into a float matrix
+
+        Returns:
+            Matrix of shape (len(texts), dim)
+        """
+        hashes = [text_hash(t) for t in texts]
+
+        with self._locked():
+            rows = self._index["rows"]
+            missing: Dict[str, str] = {}
+            for h, t in zip(hashes, texts):
+                if h not in rows and h not in missing:
+                    missing[h] = t
+
+            self.misses += len(missing)
+            self.hits += len(hashes) - len(missing)
+
+            if missing:
+                vectors = encode(list(missing.values()))
+                first_row = self._append(vectors)
+                for offset, h in enumerate(missing):
+                    rows[h] = first_row + offset
+
+            for ref, h in zip(references, hashes):
+                self._index["references"][ref or TEXT_KEY_PREFIX + h] = h
+
+            self._save_index()
+            matrix = self.matrix()
+
+        return np.asarray(matrix[[rows[h] for h in hashes]])
+
+    def evict(self, live_references: Iterable[str], force: bool = False) -> int:
+        """
+        Drop the vectors of references no longer used by any alert.
+
+        Args:
+            live_references: Keys (see embedding_key) of the records still present in at least one alert
+            force: Compact the matrix even below EVICTION_MIN_RATIO
+
+        Returns:
+            Number of vectors removed from the matrix
+        """
+        live = set(live_references)
+
+        with self._locked():
+            references = self._index["references"]
+            dead = [r for r in references if r not in live]
+            for ref in dead:
+                del references[ref]
+
+            kept_hashes = set(references.values())
+            rows = self._index["rows"]
+            orphans = [h for h in rows if h not in kept_hashes]
+            if not orphans or (not force and len(orphans) < EVICTION_MIN_RATIO * len(rows)):
+                if dead:
+                    self._save_index()
+                return 0
+
+            kept = sorted((row, h) for h, row in rows.items() if h in kept_hashes)
+            matrix = self.matrix()
+            compacted = np.array(matrix[[row for row, _ in kept]], dtype=np.float32)
+            del matrix
+
+            tmp_path = self.matrix_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compacted.tobytes())
+            os.replace(tmp_path, self.matrix_path)
+
+            self._index["rows"] = {h: new_row for new_row, (_, h) in enumerate(kept)}
+            self._index["generation"] = self._index.get("generation", 0) + 1
+            self._save_index()
+
+        logger.info(f"Evicted {len(orphans)} embedding(s) from {self.folder}")
+        return len(orphans)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Read the current state of the store without modifying it.
+
+        Returns:
+            Dictionary with the matrix (memory map), the row of each hash,
+            the hash of each reference and the generation of the rows
+        """
+        with self._locked(shared=True):
+            return {
+                "matrix": self.matrix(),
+                "rows": dict(self._index["rows"]),
+                "references": dict(self._index["references"]),
+                "generation": self._index.get("generation", 0),
+            }
+
+    def index_mtime(self) -> int:
+        """Modification time of the index, to detect new vectors cheaply."""
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit rate and disk usage of the store."""
+        lookups = self.hits + self.misses
+        bytes_on_disk = sum(
+            os.path.getsize(path) for path in (self.matrix_path, self.index_path) if os.path.exists(path)
+        )
+        return {
+            "vectors": len(self._index["rows"]),
+            "references": len(self._index["references"]),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_on_disk": bytes_on_disk,
+        }
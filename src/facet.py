@@ -1,18 +1,20 @@
 import asyncio
+import bisect
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional, Union
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from .request import request_api_async
-from .utils import load_json
+from .request import EC_API_BASE_URL, request_api_async
+from .utils import file_version, load_json
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # API endpoints and parameters
-FACET_API_URL = "https://api.tech.ec.europa.eu/search-api/prod/rest/facet"
+FACET_API_URL = f"{EC_API_BASE_URL}/facet"
 FACET_API_PARAMS = {"apiKey": "SEDIA", "text": "***"}
 
 # File paths configuration
@@ -22,6 +24,9 @@ CONFIG_PATHS = {
 }
 FACET_DATA_PATH = 'data/facet.json'
 
+# Number of suggestions returned by default
+DEFAULT_SUGGESTIONS = 20
+
 # Type definitions
 FacetEntry = Dict[str, str]
 FacetList = List[Dict[str, List[FacetEntry]]]
@@ -209,3 +214,91 @@ def _find_facet_by_name(facet_data: FacetList, facet_name: str) -> Optional[Dict
         return None
         
     return facet_entry
+
+
+
+class FacetIndex:
+    """
+    In-memory prefix and infix index over the readable values of a facet.
+
+    Prefix matches are found by bisection in the sorted values, infix matches
+    by bisection in a suffix array of the lowercase values.
+    """
+
+    def __init__(self, values: List[str]):
+        self.values = sorted({v for v in values if v}, key=lambda v: (v.lower(), v))
+        self._keys = [v.lower() for v in self.values]
+        # Tableau de suffixes : (suffixe, indice de la valeur), trié par suffixe
+        suffixes: List[Tuple[str, int]] = [
+            (key[offset:], index)
+            for index, key in enumerate(self._keys)
+            for offset in range(1, len(key))
+        ]
+        suffixes.sort()
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._suffix_values = [index for _, index in suffixes]
+
+    def suggest(self, q: str, limit: int = DEFAULT_SUGGESTIONS) -> List[str]:
+        """
+        Return the values starting with q, then the values containing q.
+
+        Args:
+            q: Text typed by the user, case insensitive
+            limit: Maximum number of values returned
+
+        Returns:
+            Matching values, prefix matches first, in alphabetical order
+        """
+        q = q.strip().lower()
+        if not q:
+            return self.values[:limit]
+
+        found: List[int] = []
+        seen = set()
+        start = bisect.bisect_left(self._keys, q)
+        for index in range(start, len(self._keys)):
+            if len(found) >= limit or not self._keys[index].startswith(q):
+                break
+            found.append(index)
+            seen.add(index)
+
+        position = bisect.bisect_left(self._suffixes, q)
+        infix: List[int] = []
+        while len(found) + len(infix) < limit and position < len(self._suffixes) and self._suffixes[position].startswith(q):
+            index = self._suffix_values[position]
+            if index not in seen:
+                seen.add(index)
+                infix.append(index)
+            position += 1
+
+        return [self.values[index] for index in found + sorted(infix)]
+
+
+_indexes: Dict[str, FacetIndex] = {}
+_indexes_version: Optional[str] = None
+_indexes_lock = threading.Lock()
+
+
+def get_facet_index(facet_name: str) -> Optional[FacetIndex]:
+    """
+    Return the suggestion index of a facet, rebuilt when the facet file changes.
+
+    Args:
+        facet_name: Name of the facet
+
+    Returns:
+        The index, or None if the facet does not exist
+    """
+    global _indexes_version
+    version = file_version(FACET_DATA_PATH)
+    with _indexes_lock:
+        if version != _indexes_version:
+            _indexes.clear()
+            _indexes_version = version
+        if facet_name not in _indexes:
+            facet_data = _load_facet_data()
+            facet_entry = _find_facet_by_name(facet_data, facet_name) if facet_data else None
+            if not facet_entry:
+                return None
+            _indexes[facet_name] = FacetIndex([item.get('value') for item in facet_entry[facet_name]])
+        return _indexes[facet_name]
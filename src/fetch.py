@@ -1,13 +1,19 @@
 import asyncio
+import hashlib
 import json
 import logging
 import os
+import time
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from .facet import get_value_from_rawValue
-from .request import request_api_async
+from .metrics import DETAIL_LOOKUPS, SWEEP_PAGES
+from .query import query_digest
+from .request import EC_API_BASE_URL, request_api_async
+from .text import attach_clean_text, description_text
+from .tracing import span, traced
 from .utils import load_json, save_json
 
 # =========================
@@ -15,7 +21,7 @@ from .utils import load_json, save_json
 # =========================
 
 # API configuration
-API_URL: str = "https://api.tech.ec.europa.eu/search-api/prod/rest/search"
+API_URL: str = f"{EC_API_BASE_URL}/search"
 API_PARAMS: Dict[str, str] = {"apiKey": "SEDIA", "text": "***"}
 
 # Request configuration
@@ -24,6 +30,17 @@ PAGE_SIZE: int = 100
 DATAFOLDER: str = "data"
 ALERTS_SUBFOLDER: str = f"{DATAFOLDER}/alerts"
 
+# Total results counts are reused for this long
+COUNT_CACHE_TTL_SECONDS: int = 10 * 60
+# Expired counts are purged at most once per TTL, or when the cache grows beyond this size
+COUNT_CACHE_MAX_ENTRIES: int = 1000
+
+# Live preview of a query being edited
+PREVIEW_SAMPLE_SIZE: int = 5
+PREVIEW_CACHE_TTL_SECONDS: int = 60
+DEFAULT_LANGUAGES_PATH: str = "config/languages.json"
+DEFAULT_SORT_PATH: str = "config/sort.json"
+
 # Type mappings
 TYPE_MAPPINGS: Dict[str, str] = {
     "1": "Direct calls for proposals (issued by the EU)",
@@ -69,19 +86,16 @@ def filter_results_by_keywords(
             filtered.append(result)
             continue
 
-        # Normalize description to string
-        if isinstance(description, list):
-            description_text = " ".join(description).lower()
-        else:
-            description_text = str(description).lower()
+        # Plain lowercase text, cleaned once per reference and content
+        text = description_text(result.get("reference"), description)
 
         # Exclude if any exclude keyword is present
-        if any(ex_kw in description_text for ex_kw in exclude_keywords):
+        if any(ex_kw in text for ex_kw in exclude_keywords):
             continue
 
         # If include keywords are specified, include only if at least one is present
         if include_keywords:
-            if any(in_kw in description_text for in_kw in include_keywords):
+            if any(in_kw in text for in_kw in include_keywords):
                 filtered.append(result)
         else:
             # No include keywords, so include all that passed the exclude filter
@@ -160,11 +174,93 @@ def map_type(type_code: str) -> str:
     return TYPE_MAPPINGS.get(type_code, "Other")
 
 
+# ===========================
+# Total Results Count Cache
+# ===========================
+
+# Clé de la requête -> (nombre total de résultats, instant de la mesure)
+_count_cache: Dict[str, Tuple[int, float]] = {}
+_count_cache_purged_at: float = 0.0
+
+
+def count_key(file_paths: Dict[str, str]) -> Optional[str]:
+    """
+    Hash of the query, languages and sort files sent to the API.
+
+    Args:
+        file_paths: Dictionary mapping field names to file paths
+
+    Returns:
+        Hexadecimal digest, or None if a file cannot be read
+    """
+    parts = {}
+    for field, path in sorted(file_paths.items()):
+        content = load_json(path) if os.path.exists(path) else None
+        if content is None:
+            return None
+        # La requête est comparée sous sa forme canonique
+        parts[field] = query_digest(content) if field == "query" else content
+    source = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def record_count(file_paths: Dict[str, str], response: Optional[Dict[str, Any]], key: Optional[str] = None) -> None:
+    """
+    Store the total results count of an API response, if it has one.
+
+    Args:
+        file_paths: Files sent with the request
+        response: Parsed API response
+        key: count_key of the files, when already computed for a previous page
+    """
+    if not response or "totalResults" not in response:
+        return
+    key = key or count_key(file_paths)
+    if key is None:
+        return
+    now = time.monotonic()
+    # Réinsertion en fin de dictionnaire : les entrées restent triées par instant de mesure
+    _count_cache.pop(key, None)
+    _count_cache[key] = (response["totalResults"], now)
+    _purge_counts(now)
+
+
+def _purge_counts(now: float) -> None:
+    """Remove the expired counts, once per TTL or when the cache is too large."""
+    global _count_cache_purged_at
+    if now - _count_cache_purged_at < COUNT_CACHE_TTL_SECONDS and len(_count_cache) <= COUNT_CACHE_MAX_ENTRIES:
+        return
+    _count_cache_purged_at = now
+    for expired in [k for k, (_, at) in _count_cache.items() if now - at > COUNT_CACHE_TTL_SECONDS]:
+        del _count_cache[expired]
+    # Au-delà de la taille maximale, les mesures les plus anciennes sont retirées
+    for oldest in list(_count_cache)[:max(0, len(_count_cache) - COUNT_CACHE_MAX_ENTRIES)]:
+        del _count_cache[oldest]
+
+
+def cached_count(file_paths: Dict[str, str]) -> Optional[int]:
+    """
+    Return the total results count of a request if it was measured recently.
+
+    Args:
+        file_paths: Files sent with the request
+
+    Returns:
+        The cached count, or None if missing or expired
+    """
+    key = count_key(file_paths)
+    entry = _count_cache.get(key) if key else None
+    if entry is None or time.monotonic() - entry[1] > COUNT_CACHE_TTL_SECONDS:
+        return None
+    return entry[0]
+
+
 # ===========================
 # Main Fetching Functionality
 # ===========================
 
-async def fetch_all_calls(alert: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+@traced()
+async def fetch_all_calls(alert: Dict[str, Any]) -> Optional[Tuple[List[Dict[str, Any]], int]]:
     """
     Fetch all calls from the API, filtered by keywords if provided.
     
@@ -172,13 +268,34 @@ async def fetch_all_calls(alert: Dict[str, Any]) -> Optional[List[Dict[str, Any]
         alert: Alert configuration containing file paths and keywords
         
     Returns:
-        List of dicts with 'reference' and 'identifier' or None if failed
+        List of dicts with 'reference' and 'identifier', and the total results
+        count given by the first page, or None if failed
     """
     keywords: List[str] = alert.get("keywords", [])
     all_refs: List[Dict[str, Any]] = []
 
+    file_paths = alert.get("file_paths", {})
+
+    def page_refs(resp: Dict[str, Any], page: int) -> List[Dict[str, Any]]:
+        """Keep the reference and identifier of the results of a page matching the keywords."""
+        results = resp.get("results", [])
+        filtered_results = filter_results_by_keywords(results, keywords)
+        return [
+            {
+                "reference": result.get("reference"),
+                "identifier": result.get("metadata", {}).get("identifier"),
+                "page": page # temporary for debugging
+            }
+            for result in filtered_results
+            if result.get("reference") and result.get("metadata", {}).get("identifier")
+        ]
+
+    # La première page donne aussi le nombre total de résultats : pas de requête séparée pour le compter
+    first_params = API_PARAMS.copy()
+    first_params.update({"pageNumber": 1, "pageSize": PAGE_SIZE})
     try:
-        response = await request_api_async(API_URL, API_PARAMS, alert.get("file_paths", {}))
+        with span("fetch_page", page=1):
+            response = await request_api_async(API_URL, first_params, file_paths)
     except Exception as e:
         logger.error(f"Initial API request failed: {e}", exc_info=True)
         return None
@@ -187,12 +304,14 @@ async def fetch_all_calls(alert: Dict[str, Any]) -> Optional[List[Dict[str, Any]
         logger.warning("No response received from initial API request.")
         return None
 
+    # Chaque page de la requête de l'alerte rafraîchit son nombre de résultats
+    counted_key = count_key(file_paths)
+    record_count(file_paths, response, counted_key)
     total_results: int = response.get("totalResults", 0)
-    # Store total results in the alert object for later use
-    alert["totalResults"] = total_results
     total_pages: int = (total_results + PAGE_SIZE - 1) // PAGE_SIZE
 
     logger.info(f"Total results: {total_results}, Pages to fetch: {total_pages}")
+    SWEEP_PAGES.observe(total_pages)
 
     # Use a semaphore to limit concurrent requests
     semaphore = asyncio.Semaphore(SIMULTANEOUS_REQUESTS)
@@ -203,32 +322,24 @@ async def fetch_all_calls(alert: Dict[str, Any]) -> Optional[List[Dict[str, Any]
             paged_params = API_PARAMS.copy()
             paged_params.update({"pageNumber": page, "pageSize": PAGE_SIZE})
             try:
-                resp = await request_api_async(API_URL, paged_params, alert.get("file_paths", {}))
+                with span("fetch_page", page=page):
+                    resp = await request_api_async(API_URL, paged_params, file_paths)
             except Exception as e:
                 logger.error(f"API request for page {page} failed: {e}")
                 return []
             if not resp:
                 logger.error(f"Page {page} returned no response.")
                 return []
-                
+
+            record_count(file_paths, resp, counted_key)
             logger.info(f"Fetched page {page}/{total_pages}")
-            results = resp.get("results", [])
-            filtered_results = filter_results_by_keywords(results, keywords)
-            
-            return [
-                {
-                    "reference": result.get("reference"),
-                    "identifier": result.get("metadata", {}).get("identifier"),
-                    "page": page # temporary for debugging
-                }
-                for result in filtered_results
-                if result.get("reference") and result.get("metadata", {}).get("identifier")
-            ]
-
-    # Prepare and run all page fetch tasks concurrently
-    tasks = [fetch_page(page) for page in range(1, total_pages + 1)]
+            return page_refs(resp, page)
+
+    # Prepare and run the fetch tasks of the other pages concurrently
+    tasks = [fetch_page(page) for page in range(2, total_pages + 1)]
     try:
-        pages_results = await asyncio.gather(*tasks)
+        pages_results = [page_refs(response, 1)] if total_pages else []
+        pages_results += await asyncio.gather(*tasks)
     except Exception as e:
         logger.error(f"Error during page fetching: {e}", exc_info=True)
         return None
@@ -260,9 +371,10 @@ async def fetch_all_calls(alert: Dict[str, Any]) -> Optional[List[Dict[str, Any]
     await asyncio.sleep(1)
 
     logger.info(f"Total calls fetched: {len(all_refs)}")
-    return all_refs
+    return all_refs, total_results
 
 
+@traced()
 async def get_detailed_info(
     identifier: str, 
     reference: str, 
@@ -305,9 +417,12 @@ async def get_detailed_info(
         file_paths = _prepare_file_paths(alert, tmp_query_path)
             
         # Perform the API request and process results
-        return await _fetch_and_process_results(file_paths, identifier, reference)
+        details = await _fetch_and_process_results(file_paths, identifier, reference)
+        DETAIL_LOOKUPS.labels("found" if details else "missing").inc()
+        return details
             
     except Exception as e:
+        DETAIL_LOOKUPS.labels("error").inc()
         logger.error(f"Error in get_detailed_info: {e}", exc_info=True)
         return None
     finally:
@@ -378,20 +493,22 @@ async def _fetch_and_process_results(
     reference: str
 ) -> Optional[Dict[str, Any]]:
     """Fetch results from API and process them."""
-    # Make the initial API request
-    response = await request_api_async(API_URL, API_PARAMS, file_paths)
+    # Make the initial API request, which is also the first page
+    first_params = API_PARAMS.copy()
+    first_params.update({"pageNumber": 1, "pageSize": PAGE_SIZE})
+    response = await request_api_async(API_URL, first_params, file_paths)
     
     if not response:
         logger.warning("No response received from API request.")
         return None
-    
+
     total_results: int = response.get("totalResults", 0)
     total_pages: int = (total_results + PAGE_SIZE - 1) // PAGE_SIZE
     
-    results: List[Dict[str, Any]] = []
+    results: List[Dict[str, Any]] = list(response.get("results", []))
     
-    # Fetch all pages
-    for page in range(1, total_pages + 1):
+    # Fetch the other pages
+    for page in range(2, total_pages + 1):
         params_copy = API_PARAMS.copy()
         params_copy.update({"pageNumber": page, "pageSize": PAGE_SIZE})
         
@@ -433,7 +550,7 @@ def _extract_call_details(result: Dict[str, Any], identifier: str) -> Dict[str,
         callccm2 = _get_first_value(metadata.get("callccm2Id"))
         full_url = f"https://ec.europa.eu/info/funding-tenders/opportunities/portal/screen/opportunities/competitive-calls-cs/{callccm2}"
     
-    return {
+    details = {
         "title": metadata.get("title"),
         "starting_date": format_date(metadata.get("startDate")),
         "deadline": format_date(metadata.get("deadlineDate")),
@@ -457,6 +574,9 @@ def _extract_call_details(result: Dict[str, Any], identifier: str) -> Dict[str,
         "tags": metadata.get("tags")
     }
 
+    # Texte nettoyé stocké avec le détail, réutilisé par le clustering et la recherche
+    return attach_clean_text(details)
+
 
 def _get_first_value(value: Any) -> str:
     """Safely extract the first value from a list or return the value itself."""
@@ -464,7 +584,8 @@ def _get_first_value(value: Any) -> str:
         return value[0]
     return value or ""
 
-async def get_total_results(alert: Dict[str, Any]) -> int:
+@traced()
+async def get_total_results(alert: Dict[str, Any]) -> Optional[int]:
     """
     Get the total number of results from the API.
     
@@ -472,7 +593,7 @@ async def get_total_results(alert: Dict[str, Any]) -> int:
         alert: Alert configuration containing file paths and keywords
         
     Returns:
-        Total number of results or 0 if failed
+        Total number of results, or None if it could not be fetched
     """
     try:
         # check if query file exists else create it
@@ -483,13 +604,110 @@ async def get_total_results(alert: Dict[str, Any]) -> int:
             query_path = file_paths if isinstance(file_paths, str) else ''
         
         query = alert.get("query", {})
-        if not save_json(query, query_path):
-            logger.error(f"Error saving query to {query_path}")
-            return 0
-        response = await request_api_async(API_URL, API_PARAMS, alert.get("file_paths", {}))
-        total_results = response.get("totalResults", 0) if response else 0
+        # Ne réécrire le fichier de requête que si son contenu a changé
+        if not (os.path.exists(query_path) and query_digest(load_json(query_path)) == query_digest(query)):
+            if not save_json(query, query_path):
+                logger.error(f"Error saving query to {query_path}")
+                return None
+
+        file_paths = alert.get("file_paths", {})
+        total_results = cached_count(file_paths)
+        if total_results is not None:
+            logger.info(f"Total results for alert '{alert.get('name')}' (cached): {total_results}")
+            return total_results
+
+        # Une page d'un seul résultat suffit pour obtenir le total
+        count_params = API_PARAMS.copy()
+        count_params.update({"pageNumber": 1, "pageSize": 1})
+        response = await request_api_async(API_URL, count_params, file_paths)
+        record_count(file_paths, response)
+        if not response or "totalResults" not in response:
+            logger.error(f"No total results returned for alert '{alert.get('name')}'")
+            return None
+        total_results = response["totalResults"]
         logger.info(f"Total results for alert '{alert.get('name')}': {total_results}")
         return total_results
     except Exception as e:
         logger.error(f"Error fetching total results: {e}", exc_info=True)
-        return 0
\ No newline at end of file
+        return None
+
+
+# Digest de la requête -> (aperçu, instant du calcul)
+_preview_cache: Dict[str, Tuple[Dict[str, Any], float]] = {}
+# Aperçus en cours de calcul, partagés par les requêtes identiques
+_preview_inflight: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+
+
+async def preview_query(query: Dict[str, Any], sample_size: int = PREVIEW_SAMPLE_SIZE) -> Dict[str, Any]:
+    """
+    Return the total results count and the first results of a query.
+
+    Previews are cached for a short time by query digest, and identical
+    previews requested while one is running share its API request. The
+    request runs in its own task: a caller that is cancelled (client gone)
+    does not cancel it for the others.
+
+    Args:
+        query: Query object, as built by generate_query
+        sample_size: Number of results returned with the count
+
+    Returns:
+        Dictionary with 'totalResults' and 'results' (title, identifier, deadline, status, url)
+    """
+    digest = query_digest(query)
+    cached = _preview_cache.get(digest)
+    if cached and time.monotonic() - cached[1] <= PREVIEW_CACHE_TTL_SECONDS:
+        return cached[0]
+
+    task = _preview_inflight.get(digest)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_cache_preview(query, digest, sample_size))
+        _preview_inflight[digest] = task
+        task.add_done_callback(lambda done: _preview_done(digest, done))
+    return await asyncio.shield(task)
+
+
+def _preview_done(digest: str, task: "asyncio.Task[Dict[str, Any]]") -> None:
+    if _preview_inflight.get(digest) is task:
+        del _preview_inflight[digest]
+    # Éviter l'avertissement "exception never retrieved" si tous les appelants sont partis
+    if not task.cancelled():
+        task.exception()
+
+
+async def _cache_preview(query: Dict[str, Any], digest: str, sample_size: int) -> Dict[str, Any]:
+    preview = await _fetch_preview(query, digest, sample_size)
+    now = time.monotonic()
+    _preview_cache[digest] = (preview, now)
+    # Purge des aperçus expirés
+    for expired in [k for k, (_, at) in _preview_cache.items() if now - at > PREVIEW_CACHE_TTL_SECONDS]:
+        del _preview_cache[expired]
+    return preview
+
+
+async def _fetch_preview(query: Dict[str, Any], digest: str, sample_size: int) -> Dict[str, Any]:
+    os.makedirs(ALERTS_SUBFOLDER, exist_ok=True)
+    tmp_query_path = f"{ALERTS_SUBFOLDER}/preview_{digest}_query_tmp.json"
+    file_paths = {"query": tmp_query_path, "languages": DEFAULT_LANGUAGES_PATH, "sort": DEFAULT_SORT_PATH}
+
+    if not _save_temp_query(query, tmp_query_path):
+        raise RuntimeError("Could not save the preview query")
+    try:
+        params = API_PARAMS.copy()
+        params.update({"pageNumber": 1, "pageSize": sample_size})
+        response = await request_api_async(API_URL, params, file_paths)
+        if not response:
+            raise RuntimeError("No response received from the API")
+        record_count(file_paths, response)
+    finally:
+        _cleanup_temp_file(tmp_query_path)
+
+    results = []
+    for result in response.get("results", [])[:sample_size]:
+        identifier = result.get("metadata", {}).get("identifier")
+        identifier = _get_first_value(identifier)
+        details = _extract_call_details(result, identifier)
+        results.append({key: details.get(key) for key in ("title", "identifier", "reference", "deadline", "status", "url")})
+
+    return {"totalResults": response.get("totalResults", 0), "results": results}
+
@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of recent jobs used for the latency figures
+LATENCY_WINDOW: int = 100
+
+JobFactory = Callable[[], Awaitable[Any]]
+
+_queues: Dict[str, "JobQueue"] = {}
+
+
+class JobQueue:
+    """
+    Asyncio job queue with at most one pending job per key.
+
+    Submitting a key that is already pending replaces its job instead of
+    queueing a second one. A key is never run by two workers at the same time:
+    a key submitted while it runs is queued again once the current job ends.
+    """
+
+    def __init__(self, name: str, workers: int = 1):
+        self.name = name
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[str, Tuple[JobFactory, float]] = {}
+        self._running: Set[str] = set()
+        self._deferred: Set[str] = set()
+        self._wait_times: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._run_times: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        _queues[name] = self
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._tasks) < self.workers:
+            # Contexte vide : les workers ne doivent pas hériter du span de l'appelant
+            self._tasks.append(loop.create_task(self._worker(), context=contextvars.Context()))
+
+    def submit(self, key: str, job: JobFactory) -> bool:
+        """
+        Queue a job unless one is already pending for the same key.
+
+        Args:
+            key: Identifier of the job (e.g. the alert name)
+            job: Function returning the coroutine to run
+
+        Returns:
+            True if a new job was queued, False if it was merged with a pending one
+        """
+        self._ensure_workers()
+        self.submitted += 1
+
+        if key in self._pending:
+            # Garder la dernière version du job, sans le remettre en file
+            self._pending[key] = (job, self._pending[key][1])
+            self.coalesced += 1
+            return False
+
+        self._pending[key] = (job, time.monotonic())
+        if key in self._running:
+            self._deferred.add(key)
+        else:
+            self._queue.put_nowait(key)
+        return True
+
+    def is_pending(self, key: str) -> bool:
+        """True if a job is queued or running for the key."""
+        return key in self._pending or key in self._running
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._queue.get()
+            job, enqueued_at = self._pending.pop(key)
+            self._running.add(key)
+            started_at = time.monotonic()
+            self._wait_times.append(started_at - enqueued_at)
+            try:
+                await job()
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Job '{key}' of queue '{self.name}' failed: {e}", exc_info=True)
+            finally:
+                self._run_times.append(time.monotonic() - started_at)
+                self._running.discard(key)
+                if key in self._deferred:
+                    self._deferred.discard(key)
+                    self._queue.put_nowait(key)
+                self._queue.task_done()
+
+    def status(self) -> Dict[str, Any]:
+        """Return the depth, activity and latencies of the queue."""
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "depth": len(self._pending),
+            "pending": sorted(self._pending),
+            "running": sorted(self._running),
+            "oldest_pending_seconds": round(max((now - t for _, t in self._pending.values()), default=0.0), 3),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_seconds": _summary(self._wait_times),
+            "run_seconds": _summary(self._run_times),
+        }
+
+
+def _summary(values: Deque[float]) -> Dict[str, float]:
+    if not values:
+        return {"avg": 0.0, "max": 0.0}
+    return {"avg": round(sum(values) / len(values), 3), "max": round(max(values), 3)}
+
+
+def queues_status() -> List[Dict[str, Any]]:
+    """Return the status of every job queue of the process."""
+    return [queue.status() for queue in _queues.values()]
@@ -1,12 +1,18 @@
+import asyncio
 import logging
 import os
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 from dotenv import load_dotenv
 
+from .message_template import render_message
+from .metrics import EMAIL_SEND_SECONDS
 from .utils import load_json
 
 # Load environment variables
@@ -16,9 +22,13 @@ load_dotenv()
 SENDER: Optional[str] = os.getenv("APP_GOOGLE_EMAIL")
 PASSWORD: Optional[str] = os.getenv("APP_GOOGLE_PASSWORD")
 CONFIG_PATH: str = "config/config.json"
-SUBJECT: str = "Nouvelle alerte de résultats détectée"
-SMTP_SERVER: str = "smtp.gmail.com"
-SMTP_PORT: int = 465
+SMTP_SERVER: str = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT: int = int(os.getenv("SMTP_PORT", "465"))
+# Désactiver le SSL permet d'utiliser un serveur SMTP local de test
+SMTP_USE_SSL: bool = os.getenv("SMTP_USE_SSL", "true").lower() not in ("0", "false", "no")
+SMTP_TIMEOUT_SECONDS: int = 30
+# Au-delà de cette durée d'inactivité, la connexion est vérifiée avant d'être réutilisée
+SMTP_IDLE_SECONDS: int = 60
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +36,10 @@ logger = logging.getLogger(__name__)
 
 MAX_EMAIL_BODY_SIZE = 10000  # Taille maximale en caractères (ajuste si besoin)
 
+# Durée des envois par résultat, résolue une seule fois
+_SEND_SECONDS_SENT = EMAIL_SEND_SECONDS.labels("sent")
+_SEND_SECONDS_FAILED = EMAIL_SEND_SECONDS.labels("failed")
+
 def format_alert_message(result: Dict[str, Any], template: str) -> str:
     """
     Format the alert message for a single result using the provided template.
@@ -37,32 +51,8 @@ def format_alert_message(result: Dict[str, Any], template: str) -> str:
     Returns:
         Formatted HTML message with result data
     """
-    # Handle title as it might be a list or string
-    title = result.get("title", "")
-    if isinstance(title, list):
-        title = ", ".join(title)
-    
-    # Create a dictionary of all replacements
-    replacements = {
-        "{title}": title ,
-        "{starting_date}": str(result.get("starting_date", "")),
-        "{deadline}": str(result.get("deadline", "")),
-        "{type}": str(result.get("type", "")),
-        "{status}": str(result.get("status", "")),
-        "{url}": str(result.get("url", "")),
-        "{identifier}": str(result.get("identifier", "")),
-        "{reference}": str(result.get("reference", "")),
-        "{summary}": str(result.get("summary", "")),
-        "{frameworkProgramme}": str(result.get("frameworkProgramme", "")),
-    }
-    
-    # Apply all replacements to the template
-    message = template
-    for key, value in replacements.items():
-        message = message.replace(key, value)
-    
-    # Format for HTML email
-    message = message.replace("\n", "<br>")
+    # Template compilé une seule fois, partagé avec le tableau de bord
+    message = render_message(template, result)
     
     # Wrap in a styled div
     return (
@@ -71,54 +61,44 @@ def format_alert_message(result: Dict[str, Any], template: str) -> str:
         f"</div>"
     )
 
-def build_limited_email_body(results: List[Dict[str, Any]], alert_template: str) -> str:
+def limit_email_body(messages: Iterable[str], max_size: int = MAX_EMAIL_BODY_SIZE) -> str:
     """
-    Construit le corps de l'email en limitant la taille maximale.
+    Concatène des messages déjà formatés sans dépasser max_size caractères.
     Si la taille est dépassée, ajoute un message d'avertissement.
     """
-    body = ""
-    for idx, result in enumerate(results):
-        msg = format_alert_message(result, alert_template)
-        if len(body) + len(msg) > MAX_EMAIL_BODY_SIZE:
-            body += (
+    parts: List[str] = []
+    size = 0
+    for msg in messages:
+        if size + len(msg) > max_size:
+            parts.append(
                 "<div style='color:red; font-weight:bold; margin-top:20px;'>"
                 "Trop d'alertes à afficher dans cet email.<br>"
                 "Merci de consulter le site pour voir la suite."
                 "</div>"
             )
             break
-        body += msg
-    return body
+        parts.append(msg)
+        size += len(msg)
+    return "".join(parts)
 
 
-def send_email_alert(
-    results: List[Dict[str, Any]], 
-    alert_template: str, 
-    receivers: List[str],
-    subject: str = SUBJECT
-) -> bool:
+def send_rendered_email(subject: str, body: str, receivers: List[str]) -> bool:
     """
-    Send an email alert with the given results to the specified receivers.
+    Send an already rendered HTML email.
     
     Args:
-        results: List of result data to include in the email
-        alert_template: Template for formatting each result
+        subject: Email subject line
+        body: HTML body of the email
         receivers: List of email addresses to send to
-        subject: Email subject line, can include total results information
         
     Returns:
         True if email sent successfully, False otherwise
     """
-    # Validate inputs
-    if not results:
-        logger.info("No results to send.")
-        return False
-    
     if not receivers:
         logger.info("No recipients specified.")
         return False
     
-    if not SENDER or not PASSWORD:
+    if not SENDER:
         logger.error("Sender credentials are missing.")
         return False
     
@@ -127,10 +107,7 @@ def send_email_alert(
         msg = MIMEMultipart()
         msg["From"] = SENDER
         msg["To"] = ", ".join(receivers)
-        msg["Subject"] = f"{subject} ({len(results)})"
-        
-        # Call build_limited_email_body once with the entire results list
-        body = build_limited_email_body(results, alert_template)
+        msg["Subject"] = subject
         
         # Add HTML body to email
         msg.attach(MIMEText(body, 'html'))
@@ -143,6 +120,103 @@ def send_email_alert(
         return False
 
 
+class SmtpConnection:
+    """
+    Persistent authenticated SMTP connection, reused across messages.
+
+    The connection is opened on the first message. After SMTP_IDLE_SECONDS
+    without use it is checked with NOOP before being reused, and it is
+    reopened when the server closed it.
+    """
+
+    def __init__(self, server: str = SMTP_SERVER, port: int = SMTP_PORT, use_ssl: bool = SMTP_USE_SSL):
+        self.server = server
+        self.port = port
+        self.use_ssl = use_ssl
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.server, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        else:
+            smtp = smtplib.SMTP(self.server, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        if PASSWORD:
+            smtp.login(SENDER, PASSWORD)
+        logger.info(f"SMTP connection opened to {self.server}:{self.port}")
+        return smtp
+
+    def _is_alive(self) -> bool:
+        try:
+            return self._smtp.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _get(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS and not self._is_alive():
+            self._discard()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _discard(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def send(self, msg: MIMEMultipart, receivers: List[str]) -> None:
+        """
+        Send a message, reconnecting once if the server dropped the connection.
+
+        Raises:
+            smtplib.SMTPException: If the message could not be sent
+        """
+        with self._lock:
+            try:
+                self._get().sendmail(SENDER, receivers, msg.as_string())
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                logger.info("SMTP connection lost, reconnecting.")
+                self._discard()
+                self._get().sendmail(SENDER, receivers, msg.as_string())
+            self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._discard()
+
+
+# Connexion partagée, utilisée depuis un thread dédié pour ne pas bloquer la boucle asyncio
+_connection = SmtpConnection()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+
+
+async def send_rendered_emails_async(messages: List[Tuple[str, str, List[str]]]) -> List[bool]:
+    """
+    Send a batch of rendered emails from the mail thread, over the shared connection.
+
+    Args:
+        messages: List of (subject, body, receivers)
+
+    Returns:
+        For each message, True if it was sent successfully
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, lambda: [send_rendered_email(subject, body, receivers) for subject, body, receivers in messages]
+    )
+
+
+def close_connection() -> None:
+    """Close the shared SMTP connection."""
+    _connection.close()
+
+
 def _send_email(msg: MIMEMultipart, receivers: List[str]) -> bool:
     """
     Send the prepared email message.
@@ -154,18 +228,20 @@ def _send_email(msg: MIMEMultipart, receivers: List[str]) -> bool:
     Returns:
         True if sent successfully, False otherwise
     """
+    started_at = time.perf_counter()
     try:
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT) as server:
-            server.login(SENDER, PASSWORD)
-            server.sendmail(SENDER, receivers, msg.as_string())
+        _connection.send(msg, receivers)
             
+        _SEND_SECONDS_SENT.observe(time.perf_counter() - started_at)
         logger.info(f"Email sent successfully to {', '.join(receivers)}.")
         return True
         
     except smtplib.SMTPException as smtp_err:
+        _SEND_SECONDS_FAILED.observe(time.perf_counter() - started_at)
         logger.error(f"SMTP error sending email: {smtp_err}")
         return False
         
     except Exception as e:
+        _SEND_SECONDS_FAILED.observe(time.perf_counter() - started_at)
         logger.error(f"Unexpected error sending email: {e}", exc_info=True)
         return False
@@ -0,0 +1,111 @@
+import re
+from functools import lru_cache
+from html import escape
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+# Placeholders available in the alert message template
+PLACEHOLDERS = (
+    "title", "starting_date", "deadline", "type", "status",
+    "url", "identifier", "reference", "summary", "frameworkProgramme",
+)
+
+_PLACEHOLDER_RE = re.compile(r"\{(" + "|".join(PLACEHOLDERS) + r")\}")
+
+# Number of distinct templates kept compiled
+TEMPLATE_CACHE_SIZE: int = 256
+
+# A segment is either a literal (field None) or a placeholder (literal empty)
+Segment = Tuple[str, Optional[str]]
+
+
+def _field_value(result: Mapping[str, Any], field: str) -> str:
+    value = result.get(field, "")
+    if field == "title" and isinstance(value, list):
+        # Handle title as it might be a list or string
+        return ", ".join(str(v) for v in value)
+    return str(value)
+
+
+def url_as_link(result: Mapping[str, Any], field: str) -> str:
+    """Render the url placeholder as an HTML link, other placeholders as text."""
+    value = _field_value(result, field)
+    if field == "url":
+        url = escape(value, quote=True)
+        return f'<a href="{url}" class="text-blue-600 underline" target="_blank">{url}</a>'
+    return value
+
+
+class CompiledTemplate:
+    """
+    Alert message template parsed once into literal and placeholder segments.
+
+    Literal newlines are converted to <br> at compile time; rendering only
+    joins the literals with the values of the placeholders.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self.segments: List[Segment] = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(template):
+            if match.start() > position:
+                self.segments.append((template[position:match.start()].replace("\n", "<br>"), None))
+            self.segments.append(("", match.group(1)))
+            position = match.end()
+        if position < len(template):
+            self.segments.append((template[position:].replace("\n", "<br>"), None))
+
+    def render(
+        self,
+        result: Mapping[str, Any],
+        value: Callable[[Mapping[str, Any], str], str] = _field_value
+    ) -> str:
+        """
+        Render the template for a single result.
+
+        Args:
+            result: The result data containing call information
+            value: Function returning the text of a placeholder
+
+        Returns:
+            The message, newlines converted to <br>
+        """
+        return "".join(
+            literal if field is None else value(result, field).replace("\n", "<br>")
+            for literal, field in self.segments
+        )
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(template: Optional[str]) -> CompiledTemplate:
+    """
+    Return the compiled version of a message template.
+
+    The cache is keyed by the template text, so editing an alert message
+    compiles the new version on its first use.
+
+    Args:
+        template: Message template with placeholder keys
+
+    Returns:
+        The compiled template
+    """
+    return CompiledTemplate(template or "")
+
+
+def render_message(template: Optional[str], result: Dict[str, Any], link_url: bool = False) -> str:
+    """
+    Render an alert message template for a single result.
+
+    Args:
+        template: Message template with placeholder keys
+        result: The result data containing call information
+        link_url: Render {url} as an HTML link (dashboard)
+
+    Returns:
+        The rendered message
+    """
+    compiled = compile_template(template)
+    if link_url:
+        return compiled.render(result, url_as_link)
+    return compiled.render(result)
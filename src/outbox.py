@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .mail import send_rendered_emails_async
+from .tracing import span
+from .utils import load_json, save_json
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH: str = "data/outbox.json"
+
+# Sender settings
+OUTBOX_POLL_SECONDS: int = 10
+OUTBOX_BATCH_SIZE: int = 20
+OUTBOX_MAX_ATTEMPTS: int = 8
+# Délai avant la première nouvelle tentative, doublé à chaque échec
+OUTBOX_RETRY_BASE_SECONDS: int = 60
+OUTBOX_RETRY_MAX_SECONDS: int = 6 * 60 * 60
+# Sent messages are kept this long, for the status figures
+OUTBOX_SENT_RETENTION_SECONDS: int = 7 * 24 * 60 * 60
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+# Every read-modify-write of the outbox file goes through this lock
+_lock = threading.RLock()
+
+
+def outbox_key(alert_name: str, references: List[str], recipients: List[str], detection: str) -> str:
+    """
+    Idempotency key of a notification: same detection, alert, calls and recipients give the same key.
+
+    Args:
+        alert_name: Name of the alert
+        references: References of the notified calls
+        recipients: Email addresses of the recipients
+        detection: Identifier of the detection (e.g. its window start), so a later
+            notification of the same calls gets a new key
+
+    Returns:
+        Hexadecimal digest
+    """
+    source = "\n".join([alert_name, detection, ",".join(sorted(references)), ",".join(sorted(recipients))])
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def load_outbox() -> List[Dict[str, Any]]:
+    """
+    Load every message of the outbox.
+
+    Returns:
+        List of outbox rows, empty if the file is missing or invalid
+    """
+    if not os.path.exists(OUTBOX_PATH):
+        return []
+    return load_json(OUTBOX_PATH) or []
+
+
+def _save_outbox(rows: List[Dict[str, Any]]) -> bool:
+    # Écriture dans un fichier temporaire puis remplacement atomique
+    tmp_path = f"{OUTBOX_PATH}.tmp"
+    if not save_json(rows, tmp_path):
+        return False
+    os.replace(tmp_path, OUTBOX_PATH)
+    return True
+
+
+def enqueue_notification(
+    alert_name: str,
+    recipients: List[str],
+    subject: str,
+    body: str,
+    references: List[str],
+    detection: str = ""
+) -> Optional[str]:
+    """
+    Persist a rendered notification for the background sender.
+
+    A notification still pending with the same key is not added again. A sent
+    or failed one with the same key is replaced, so it can be sent again.
+
+    Args:
+        alert_name: Name of the alert
+        recipients: Email addresses of the recipients
+        subject: Rendered subject
+        body: Rendered HTML body
+        references: References of the notified calls
+        detection: Identifier of the detection, part of the key
+
+    Returns:
+        The key of the notification, or None if it could not be saved
+    """
+    if not recipients:
+        logger.info(f"No recipients for alert '{alert_name}', nothing to enqueue.")
+        return None
+
+    key = outbox_key(alert_name, references, recipients, detection)
+    now = time.time()
+    with _lock:
+        rows = load_outbox()
+        if any(row.get("id") == key and row.get("status") == STATUS_PENDING for row in rows):
+            logger.info(f"Notification {key} for alert '{alert_name}' already pending in the outbox.")
+            return key
+        # Les identifiants restent uniques dans l'outbox
+        rows = [row for row in rows if row.get("id") != key]
+        rows.append({
+            "id": key,
+            "alert": alert_name,
+            "recipients": recipients,
+            "subject": subject,
+            "body": body,
+            "references": references,
+            "status": STATUS_PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "last_error": None,
+            "created_at": now,
+            "sent_at": None,
+        })
+        if not _save_outbox(rows):
+            logger.error(f"Could not save notification for alert '{alert_name}' to the outbox.")
+            return None
+
+    logger.info(f"Notification {key} for alert '{alert_name}' added to the outbox.")
+    return key
+
+
+def _due_rows(now: float, limit: int) -> List[Dict[str, Any]]:
+    with _lock:
+        rows = [
+            row for row in load_outbox()
+            if row.get("status") == STATUS_PENDING and row.get("next_attempt_at", 0) <= now
+        ]
+    rows.sort(key=lambda row: row.get("next_attempt_at", 0))
+    return rows[:limit]
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+
+
+def _record_results(results: Dict[str, bool], now: float) -> None:
+    with _lock:
+        rows = load_outbox()
+        for row in rows:
+            if row.get("id") not in results or row.get("status") != STATUS_PENDING:
+                continue
+            if results[row["id"]]:
+                row["status"] = STATUS_SENT
+                row["sent_at"] = now
+                row["last_error"] = None
+                # Le corps n'est plus utile une fois le message envoyé
+                row["body"] = ""
+                continue
+            row["attempts"] = row.get("attempts", 0) + 1
+            row["last_error"] = "SMTP send failed"
+            if row["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                row["status"] = STATUS_FAILED
+                logger.error(f"Notification {row['id']} for alert '{row.get('alert')}' failed {row['attempts']} times, giving up.")
+            else:
+                row["next_attempt_at"] = now + _retry_delay(row["attempts"])
+
+        # Purge des messages envoyés depuis plus longtemps que la rétention
+        rows = [
+            row for row in rows
+            if row.get("status") != STATUS_SENT or now - (row.get("sent_at") or now) < OUTBOX_SENT_RETENTION_SECONDS
+        ]
+        _save_outbox(rows)
+
+
+async def process_outbox() -> int:
+    """
+    Send the due notifications, one batch at a time over the shared SMTP connection.
+
+    Delivery is at least once: a message sent just before a crash is sent
+    again on restart, since its row is still pending.
+
+    Returns:
+        Number of notifications sent
+    """
+    sent = 0
+    while True:
+        now = time.time()
+        batch = _due_rows(now, OUTBOX_BATCH_SIZE)
+        if not batch:
+            return sent
+
+        with span("outbox.send", messages=len(batch)):
+            outcomes = await send_rendered_emails_async(
+                [(row["subject"], row["body"], row["recipients"]) for row in batch]
+            )
+        results = {row["id"]: ok for row, ok in zip(batch, outcomes)}
+        _record_results(results, now)
+        sent += sum(outcomes)
+
+        # Ne pas insister pendant une panne du serveur, les retries sont planifiés
+        if not any(outcomes):
+            return sent
+
+
+async def outbox_sender_task() -> None:
+    """Drain the outbox in the background, independently of the detection cycle."""
+    while True:
+        try:
+            sent = await process_outbox()
+            if sent:
+                logger.info(f"{sent} notification(s) sent from the outbox.")
+        except Exception as e:
+            logger.error(f"Error in outbox sender: {e}", exc_info=True)
+        await asyncio.sleep(OUTBOX_POLL_SECONDS)
+
+
+def outbox_status() -> Dict[str, int]:
+    """Return the number of outbox messages per status."""
+    counts = {STATUS_PENDING: 0, STATUS_SENT: 0, STATUS_FAILED: 0}
+    for row in load_outbox():
+        status = row.get("status", STATUS_PENDING)
+        counts[status] = counts.get(status, 0) + 1
+    return counts
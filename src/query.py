@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import Any, Dict, List, Optional
 
 # Type aliases for better readability
@@ -9,6 +11,9 @@ DEFAULT_TYPES = ["1", "2", "8"]
 DEFAULT_STATUSES = ["31094501", "31094502", "31094503"]
 DEFAULT_OPERATOR = "AND"
 
+# Lists of clauses whose order does not change the result of the query
+UNORDERED_CLAUSE_LISTS = ("must", "should", "filter", "must_not")
+
 # Available text search fields
 TEXT_SEARCH_FIELDS = [
     "identifier", "keywords", "tags", "typesOfAction", "title",
@@ -131,4 +136,84 @@ def generate_query(
         add_text_search_clause(text_search, TEXT_SEARCH_FIELDS, must_clauses)
 
     # Compile the final query
-    return {"bool": {"must": must_clauses}}
\ No newline at end of file
+    return {"bool": {"must": must_clauses}}
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def _canonical_scalar(value: Any) -> Any:
+    # Les valeurs de termes sont des chaînes pour l'API ("1" et 1 désignent le même type)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def _canonical_clause_list(clauses: List[Any]) -> List[Any]:
+    unique = {}
+    for clause in clauses:
+        canonical = canonicalize_query(clause)
+        if canonical not in ({}, None):
+            unique.setdefault(_canonical_json(canonical), canonical)
+    return [unique[key] for key in sorted(unique)]
+
+
+def canonicalize_query(query: Any) -> Any:
+    """
+    Return the canonical form of a query.
+
+    Term lists and field lists are sorted and deduplicated, ranges without
+    bounds are dropped and boolean clause lists are deduplicated and sorted,
+    so two queries returning the same results have the same canonical form.
+
+    Args:
+        query: Query object (or part of a query)
+
+    Returns:
+        A new, canonical query object
+    """
+    if isinstance(query, list):
+        return [canonicalize_query(item) for item in query]
+    if not isinstance(query, dict):
+        return query
+
+    canonical: Dict[str, Any] = {}
+    for key, value in query.items():
+        if key == "terms" and isinstance(value, dict):
+            canonical[key] = {
+                field: sorted({_canonical_scalar(v) for v in values}, key=str) if isinstance(values, list) else values
+                for field, values in value.items()
+            }
+        elif key == "range" and isinstance(value, dict):
+            bounds = {
+                field: {op: bound for op, bound in (limits or {}).items() if bound is not None}
+                for field, limits in value.items()
+            }
+            bounds = {field: limits for field, limits in bounds.items() if limits}
+            if not bounds:
+                return {}
+            canonical[key] = bounds
+        elif key == "fields" and isinstance(value, list):
+            canonical[key] = sorted(set(value))
+        elif key in UNORDERED_CLAUSE_LISTS and isinstance(value, list):
+            canonical[key] = _canonical_clause_list(value)
+        else:
+            canonical[key] = canonicalize_query(value)
+    return canonical
+
+
+def query_digest(query: Any) -> str:
+    """
+    Stable digest of the canonical form of a query.
+
+    A missing query (None) has its own digest, distinct from the empty query {}.
+
+    Args:
+        query: Query object, or None
+
+    Returns:
+        Hexadecimal digest, identical for equivalent queries
+    """
+    source = _canonical_json(canonicalize_query(query))
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
@@ -1,10 +1,25 @@
 import asyncio
+import gzip
+import hashlib
 import json
 import os
-from typing import Any, Dict, List, Optional, Tuple, BinaryIO
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, BinaryIO
 
 import aiohttp
 
+from .metrics import API_REQUEST_SECONDS, API_REQUESTS, API_RESPONSE_BYTES, API_RETRIES
+
+# Base URL of the EC search API, can point to a local stand-in (see benchmarks/ec_api.py)
+EC_API_BASE_URL: str = os.getenv("EC_API_BASE_URL", "https://api.tech.ec.europa.eu/search-api/prod/rest").rstrip("/")
+
+# Record/replay of the API exchanges in a gzip cassette, for offline benchmarks
+CASSETTE_PATH: Optional[str] = os.getenv("EC_API_CASSETTE") or None
+CASSETTE_MODE: str = os.getenv("EC_API_CASSETTE_MODE", "").lower()  # "record" or "replay"
+REPLAY_TIMING: str = os.getenv("EC_API_REPLAY_TIMING", "original").lower()  # "original" or "fast"
+
 # Constants for request configuration
 RETRY_DELAY_MULTIPLIER = 2
 MAX_ERROR_TEXT_LENGTH = 300
@@ -17,6 +32,43 @@ FormFile = Tuple[str, Tuple[str, BinaryIO, str]]
 FormFilesList = List[FormFile]
 
 
+def _endpoint(url: str) -> str:
+    """Last path segment of an API URL (e.g. 'search' or 'facet'), used as metric label."""
+    return url.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+
+
+class _EndpointMetrics:
+    """Metric children of an endpoint, resolved once instead of on every request."""
+
+    __slots__ = ("endpoint", "seconds", "response_bytes", "retries", "_requests")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.seconds = API_REQUEST_SECONDS.labels(endpoint)
+        self.response_bytes = API_RESPONSE_BYTES.labels(endpoint)
+        self.retries = API_RETRIES.labels(endpoint)
+        self._requests: Dict[str, Any] = {}
+
+    def requests(self, status: str):
+        """Request counter of an HTTP status (or "timeout" / "error")."""
+        child = self._requests.get(status)
+        if child is None:
+            child = self._requests[status] = API_REQUESTS.labels(self.endpoint, status)
+        return child
+
+
+# Endpoint -> enfants de ses métriques
+_endpoint_metrics: Dict[str, _EndpointMetrics] = {}
+
+
+def _metrics_for(endpoint: str) -> _EndpointMetrics:
+    """Return the metric children of an endpoint, created on first use."""
+    metrics = _endpoint_metrics.get(endpoint)
+    if metrics is None:
+        metrics = _endpoint_metrics[endpoint] = _EndpointMetrics(endpoint)
+    return metrics
+
+
 def build_files(file_paths: Dict[str, str]) -> FormFilesList:
     """
     Constructs a list of files to send with the request from the provided paths.
@@ -75,7 +127,9 @@ async def handle_response(response: aiohttp.ClientResponse, attempt: int, retrie
         print(f"[{attempt}/{retries}] API Error {response.status}: {error_text[:MAX_ERROR_TEXT_LENGTH]}")
         return None
 
-    text = await response.text()
+    body = await response.read()
+    _metrics_for(_endpoint(response.url.path)).response_bytes.inc(len(body))
+    text = body.decode(response.get_encoding())
 
     try:
         return json.loads(text)
@@ -107,12 +161,108 @@ async def make_request(
     Returns:
         Parsed JSON response or None if an error occurred
     """
+    metrics = _metrics_for(_endpoint(url))
+    started_at = time.perf_counter()
     try:
         async with session.post(url, params=params, data=data) as response:
+            metrics.requests(str(response.status)).inc()
             return await handle_response(response, attempt, retries)
     except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        metrics.requests("timeout" if isinstance(e, asyncio.TimeoutError) else "error").inc()
         print(f"[{attempt}/{retries}] Request failed: {repr(e)}")
         return None
+    finally:
+        metrics.seconds.observe(time.perf_counter() - started_at)
+
+
+def _normalize_part(content: bytes) -> bytes:
+    # Le JSON est comparé sous forme canonique, les noms de fichiers temporaires sont ignorés
+    try:
+        return json.dumps(json.loads(content), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return content
+
+
+def exchange_key(url: str, params: Dict[str, Any], file_paths: Dict[str, str]) -> str:
+    """
+    Key of an API exchange in a cassette.
+
+    Args:
+        url: URL of the request, without query string
+        params: URL parameters
+        file_paths: Dictionary mapping the multipart field names to file paths
+
+    Returns:
+        Hexadecimal digest of the URL, the parameters and the normalized multipart parts
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(url.split("?", 1)[0].encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    for name in sorted(file_paths):
+        with open(file_paths[name], "rb") as f:
+            content = f.read()
+        digest.update(b"\x1f" + name.encode("utf-8") + b"\x1e" + _normalize_part(content))
+    return digest.hexdigest()
+
+
+class Cassette:
+    """
+    Gzip file of recorded API exchanges, one JSON line per exchange.
+
+    An exchange recorded several times under the same key is replayed in
+    the recorded order, the last one being repeated once the others are used.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Deque[Dict[str, Any]]]] = None
+
+    def record(self, key: str, url: str, params: Dict[str, Any], elapsed: float, result: Optional[Dict[str, Any]]) -> None:
+        """Append an exchange to the cassette."""
+        line = json.dumps({"key": key, "url": url, "params": params, "elapsed": elapsed, "result": result}, ensure_ascii=False)
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Chaque ajout est un membre gzip, le fichier reste lisible d'un seul tenant
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def _load(self) -> Dict[str, Deque[Dict[str, Any]]]:
+        entries: Dict[str, Deque[Dict[str, Any]]] = {}
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries.setdefault(entry["key"], deque()).append(entry)
+        except FileNotFoundError:
+            print(f"Cassette {self.path} not found, nothing to replay.")
+        return entries
+
+    def next_exchange(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the next recorded exchange for a key, or None if it was never recorded."""
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            queue = self._entries.get(key)
+            if not queue:
+                return None
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Return the cassette configured by EC_API_CASSETTE, if record or replay is enabled."""
+    global _cassette
+    if not CASSETTE_PATH or CASSETTE_MODE not in ("record", "replay"):
+        return None
+    if _cassette is None:
+        _cassette = Cassette(CASSETTE_PATH)
+    return _cassette
 
 
 async def request_api_async(
@@ -124,6 +274,55 @@ async def request_api_async(
 ) -> Optional[Dict[str, Any]]:
     """
     Performs an asynchronous POST request with retry handling.
+
+    With EC_API_CASSETTE_MODE=record, each exchange is also written to the
+    cassette; with replay, it is served from the cassette without network,
+    after its recorded duration unless EC_API_REPLAY_TIMING=fast.
+    
+    Args:
+        url: URL to send the request to
+        params: URL parameters to include
+        file_paths: Dictionary mapping field names to file paths
+        retries: Maximum number of retry attempts
+        timeout: Request timeout in seconds
+        
+    Returns:
+        Parsed JSON response or None if all attempts failed
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return await _request_api(url, params, file_paths, retries, timeout)
+
+    try:
+        key = exchange_key(url, params, file_paths)
+    except OSError as e:
+        print(f"Cannot build the cassette key: {repr(e)}")
+        return None
+
+    if CASSETTE_MODE == "replay":
+        exchange = cassette.next_exchange(key)
+        if exchange is None:
+            print(f"No recorded exchange for {url} {params}")
+            return None
+        if REPLAY_TIMING != "fast":
+            await asyncio.sleep(exchange["elapsed"])
+        return exchange["result"]
+
+    started_at = time.perf_counter()
+    result = await _request_api(url, params, file_paths, retries, timeout)
+    cassette.record(key, url, params, time.perf_counter() - started_at, result)
+    return result
+
+
+async def _request_api(
+    url: str, 
+    params: Dict[str, Any], 
+    file_paths: Dict[str, str], 
+    retries: int = DEFAULT_RETRIES, 
+    timeout: int = DEFAULT_TIMEOUT_SECONDS
+) -> Optional[Dict[str, Any]]:
+    """
+    Performs an asynchronous POST request with retry handling, over the network.
     
     Args:
         url: URL to send the request to
@@ -145,6 +344,8 @@ async def request_api_async(
 
     for attempt in range(1, retries + 1):
         files = []
+        if attempt > 1:
+            _metrics_for(_endpoint(url)).retries.inc()
         try:
             files = build_files(file_paths)
             data = create_form_data(files)
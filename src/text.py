@@ -0,0 +1,157 @@
+import hashlib
+import html
+import json
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+# Balises HTML, retirées après le décodage des entités
+_TAG_RE = re.compile(r"<[^<]+?>")
+
+# Source fields of the clean text, in the order they are joined
+TEXT_FIELDS = (
+    "title", "summary", "keywords", "tags", "destination",
+    "callTitle", "destinationDetails", "descriptionByte",
+)
+
+# Version of the cleaning, stored with the text: texts of another version are rebuilt
+TEXT_VERSION: int = 2
+
+# Maximum number of clean texts kept in memory
+TEXT_CACHE_SIZE: int = 5000
+
+_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+
+def strip_html(x: Optional[str]) -> str:
+    """
+    Decode HTML entities, then remove HTML tags.
+
+    Entities are decoded first, so encoded markup such as "&lt;p&gt;" is
+    removed like the tags it stands for.
+
+    Args:
+        x: Text possibly containing HTML
+
+    Returns:
+        Plain text, tags replaced by spaces
+    """
+    return _TAG_RE.sub(" ", html.unescape(x or ""))
+
+
+def _join(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value if v is not None)
+    return str(value)
+
+
+def build_text(detail: Mapping[str, Any]) -> str:
+    """
+    Build the clean text of a call used by clustering, keyword filtering and search.
+
+    Args:
+        detail: Call details (as saved in lastDetails)
+
+    Returns:
+        Plain text made of the title, summary, keywords, tags, destination,
+        call title, destination details and description
+    """
+    call_title = detail.get("callTitle")
+    if isinstance(call_title, list):
+        call_title = call_title[0] if call_title else ""
+
+    description = detail.get("descriptionByte")
+    if isinstance(description, dict):
+        description = str(description)
+
+    parts = [
+        _join(detail.get("title")),
+        _join(detail.get("summary")),
+        _join(detail.get("keywords")),
+        _join(detail.get("tags")),
+        _join(detail.get("destination")),
+        _join(call_title),
+        _join(detail.get("destinationDetails")),
+        _join(description),
+    ]
+    return strip_html(" ".join(parts))
+
+
+def content_hash(detail: Mapping[str, Any]) -> str:
+    """
+    Hash of the source fields of the clean text.
+
+    Args:
+        detail: Call details
+
+    Returns:
+        Hexadecimal digest, identical for identical source fields
+    """
+    source = json.dumps([detail.get(field) for field in TEXT_FIELDS], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cached(key: Tuple[str, str], compute) -> str:
+    text = _cache.get(key)
+    if text is not None:
+        _cache.move_to_end(key)
+        return text
+    text = compute()
+    _cache[key] = text
+    if len(_cache) > TEXT_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return text
+
+
+def prepare_text(detail: Mapping[str, Any]) -> str:
+    """
+    Return the clean text of a call, computed once per (reference, content hash).
+
+    The text stored with the detail at ingest time is reused when present
+    and built by the current TEXT_VERSION.
+
+    Args:
+        detail: Call details
+
+    Returns:
+        Clean text of the call
+    """
+    stored = detail.get("clean_text")
+    if isinstance(stored, str) and detail.get("clean_text_version") == TEXT_VERSION:
+        return stored
+    key = (str(detail.get("reference") or ""), content_hash(detail))
+    return _cached(key, lambda: build_text(detail))
+
+
+def attach_clean_text(detail: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store the clean text of a call alongside its details.
+
+    Args:
+        detail: Call details, updated in place
+
+    Returns:
+        The updated details
+    """
+    detail.pop("clean_text", None)
+    detail["clean_text"] = prepare_text(detail)
+    detail["clean_text_version"] = TEXT_VERSION
+    return detail
+
+
+def description_text(reference: Optional[str], description: Any) -> str:
+    """
+    Return the lowercase plain text of a description, for keyword filtering.
+
+    Args:
+        reference: Reference of the call
+        description: Raw 'descriptionByte' value from the API
+
+    Returns:
+        Lowercase text without HTML
+    """
+    raw = _join(description)
+    key = (f"description:{reference or ''}", hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest())
+    return _cached(key, lambda: strip_html(raw).lower())
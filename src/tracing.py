@@ -0,0 +1,229 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+# Number of finished traces kept in memory for /debug/traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "50"))
+# Optional file receiving each finished trace as one OTLP/JSON line
+TRACE_EXPORT_PATH: Optional[str] = os.getenv("TRACE_EXPORT_PATH") or None
+SERVICE_NAME = "veille-appels-offres"
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_lock = threading.Lock()
+# Spans terminés des traces dont la racine est encore ouverte
+_open_traces: Dict[str, List["Span"]] = {}
+_finished: Deque[List["Span"]] = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+class Span:
+    """A timed stage of a trace; times are epoch nanoseconds."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error", "discarded")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.discarded = False
+
+    @property
+    def is_root(self) -> bool:
+        return self.parent_id is None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def discard(self) -> None:
+        """Drop this trace when the root span ends (e.g. a cycle with nothing to do)."""
+        self.discarded = True
+
+
+@contextmanager
+def span(name: str, root: bool = True, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a span, child of the current span of the context.
+
+    Args:
+        name: Name of the stage
+        root: Start a new trace when there is no current span; when False,
+            the block is only traced inside an existing trace
+        attributes: Attributes of the span
+
+    Yields:
+        The span, or None when the block is not traced
+    """
+    parent = _current_span.get()
+    if parent is None and not root:
+        yield None
+        return
+
+    current = Span(name, parent, attributes)
+    if current.is_root:
+        with _lock:
+            _open_traces[current.trace_id] = []
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        _finish(current)
+
+
+def traced(name: Optional[str] = None, root: bool = True):
+    """
+    Decorator tracing each call of a function, sync or async, as a span.
+
+    Args:
+        name: Name of the span, the function name by default
+        root: See span()
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, root=root):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, root=root):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def _finish(current: Span) -> None:
+    with _lock:
+        spans = _open_traces.get(current.trace_id)
+        # Une tâche encore en cours après la fin de la racine n'est pas gardée
+        if spans is None:
+            return
+        spans.append(current)
+        if not current.is_root:
+            return
+        del _open_traces[current.trace_id]
+        if current.discarded:
+            return
+        _finished.append(spans)
+
+    if TRACE_EXPORT_PATH:
+        _export(spans)
+
+
+def recent_traces(limit: int = TRACE_BUFFER_SIZE) -> List[List[Span]]:
+    """Return the last finished traces, most recent first."""
+    with _lock:
+        traces = list(_finished)
+    return traces[::-1][:limit]
+
+
+def trace_timeline(spans: List[Span]) -> Dict[str, Any]:
+    """
+    Lay out the spans of a trace as a waterfall.
+
+    Args:
+        spans: Spans of a finished trace
+
+    Returns:
+        Dict with the root name, start, duration and the rows of the spans,
+        each row giving its depth and its offset and width in percent of the trace
+    """
+    root = next(s for s in spans if s.is_root)
+    total_ns = max(root.end_ns - root.start_ns, 1)
+    children: Dict[Optional[str], List[Span]] = {}
+    for s in spans:
+        children.setdefault(s.parent_id, []).append(s)
+
+    rows: List[Dict[str, Any]] = []
+
+    def visit(s: Span, depth: int) -> None:
+        rows.append({
+            "name": s.name,
+            "depth": depth,
+            "offset": 100 * (s.start_ns - root.start_ns) / total_ns,
+            "width": max(100 * (s.end_ns - s.start_ns) / total_ns, 0.2),
+            "duration_ms": s.duration_ms,
+            "attributes": s.attributes,
+            "error": s.error,
+        })
+        for child in sorted(children.get(s.span_id, []), key=lambda c: c.start_ns):
+            visit(child, depth + 1)
+
+    visit(root, 0)
+    return {
+        "name": root.name,
+        "trace_id": root.trace_id,
+        "started_at": time.strftime("%d-%m-%Y %H:%M:%S", time.localtime(root.start_ns / 1e9)),
+        "duration_ms": root.duration_ms,
+        "spans": rows,
+    }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(s: Span) -> Dict[str, Any]:
+    otlp = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+    }
+    if s.parent_id:
+        otlp["parentSpanId"] = s.parent_id
+    return otlp
+
+
+def _export(spans: List[Span]) -> None:
+    """Append a trace to TRACE_EXPORT_PATH in the OTLP/JSON file exporter format."""
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [_otlp_span(s) for s in spans]}],
+        }]
+    }
+    try:
+        with _lock, open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.error(f"Error exporting trace to {TRACE_EXPORT_PATH}: {e}")
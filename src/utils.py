@@ -1,8 +1,12 @@
 import json
 import logging
 import os
+import time
 from typing import Any, Optional
 
+from .metrics import JSON_SAVE_SECONDS
+from .tracing import traced
+
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,6 +39,7 @@ def load_json(file_path: str) -> Optional[Any]:
         return None
 
 
+@traced(root=False)
 def save_json(data: Any, file_path: str) -> bool:
     """
     Save data as JSON to a file.
@@ -46,6 +51,7 @@ def save_json(data: Any, file_path: str) -> bool:
     Returns:
         True if save was successful, False otherwise
     """
+    started_at = time.perf_counter()
     try:
         # Ensure directory exists
         directory = os.path.dirname(file_path)
@@ -65,6 +71,41 @@ def save_json(data: Any, file_path: str) -> bool:
     except Exception as e:
         logger.error(f"Error saving file {file_path}: {e}", exc_info=True)
         return False
+    finally:
+        JSON_SAVE_SECONDS.observe(time.perf_counter() - started_at)
+
+
+def file_version(file_path: str) -> str:
+    """
+    Return a token that changes every time a file is written.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        Version token derived from the modification time and size of the file, "0" if missing
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return "0"
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def file_mtime(file_path: str) -> float:
+    """
+    Return the modification time of a file, 0 if it is missing.
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        Modification time in seconds since the epoch
+    """
+    try:
+        return os.path.getmtime(file_path)
+    except OSError:
+        return 0.0
 
 
 def delete_json(file_path: str) -> bool:
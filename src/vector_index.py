@@ -0,0 +1,237 @@
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_store import TEXT_KEY_PREFIX, EmbeddingStore
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Approximate (IVF) index, only used for large corpora when enabled
+APPROXIMATE_INDEX: bool = os.getenv("VECTOR_INDEX_APPROXIMATE", "").lower() in ("1", "true", "yes")
+APPROXIMATE_MIN_VECTORS: int = 100_000
+APPROXIMATE_PROBES: int = 8
+
+DEFAULT_TOP_K: int = 10
+
+SearchHit = Tuple[str, float]
+
+
+class _IndexState:
+    """
+    Vectors of the index and everything derived from them, never modified once built.
+
+    A refresh builds a new state and swaps it in with a single assignment,
+    so a search always reads a matrix, norms and lists of the same rows.
+    """
+
+    __slots__ = (
+        "mtime", "generation", "matrix", "norms", "hash_by_row", "row_by_hash",
+        "references_by_hash", "hash_by_reference", "lists", "list_centroids",
+    )
+
+    def __init__(
+        self,
+        mtime: int = -1,
+        generation: int = -1,
+        matrix: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        hash_by_row: Optional[List[Optional[str]]] = None,
+        row_by_hash: Optional[Dict[str, int]] = None,
+        references_by_hash: Optional[Dict[str, List[str]]] = None,
+        hash_by_reference: Optional[Dict[str, str]] = None,
+        lists: Optional[np.ndarray] = None,
+        list_centroids: Optional[np.ndarray] = None,
+    ):
+        self.mtime = mtime
+        self.generation = generation
+        self.matrix = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        self.norms = norms if norms is not None else np.zeros(0, dtype=np.float32)
+        self.hash_by_row = hash_by_row or []
+        self.row_by_hash = row_by_hash or {}
+        self.references_by_hash = references_by_hash or {}
+        self.hash_by_reference = hash_by_reference or {}
+        self.lists = lists
+        self.list_centroids = list_centroids
+
+
+class VectorIndex:
+    """
+    Similarity search over the vectors of the embedding store.
+
+    The search is an exact normalized dot product over the memory-mapped
+    matrix. With VECTOR_INDEX_APPROXIMATE enabled and a large enough store,
+    an inverted-file index (coarse KMeans lists, probed by similarity) limits
+    the scored rows. New vectors are picked up at the next search without
+    rebuilding the index, unless the store was compacted in between.
+
+    Searches run in threads: they read the current state once and never
+    see a refresh half done.
+    """
+
+    def __init__(self, store: EmbeddingStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._state = _IndexState()
+
+    def refresh(self) -> _IndexState:
+        """Reload the store if it changed since the last search, and return the current state."""
+        mtime = self.store.index_mtime()
+        if mtime == self._state.mtime:
+            return self._state
+
+        with self._lock:
+            previous = self._state
+            # Un autre thread a pu rafraîchir l'index pendant l'attente du verrou
+            if mtime == previous.mtime:
+                return previous
+
+            snapshot = self.store.snapshot()
+            matrix = snapshot["matrix"]
+            rebuild = snapshot["generation"] != previous.generation or len(matrix) < len(previous.hash_by_row)
+            first_new_row = 0 if rebuild else len(previous.hash_by_row)
+
+            hash_by_row: List[Optional[str]] = [None] * len(matrix)
+            for h, row in snapshot["rows"].items():
+                if row < len(hash_by_row):
+                    hash_by_row[row] = h
+
+            references_by_hash: Dict[str, List[str]] = {}
+            for ref, h in snapshot["references"].items():
+                # Les textes sans référence ne sont pas des résultats de recherche
+                if not ref.startswith(TEXT_KEY_PREFIX):
+                    references_by_hash.setdefault(h, []).append(ref)
+
+            new_norms = np.linalg.norm(matrix[first_new_row:], axis=1).astype(np.float32) if len(matrix) else np.zeros(0, dtype=np.float32)
+            new_norms[new_norms == 0] = 1.0
+            norms = new_norms if rebuild else np.concatenate([previous.norms, new_norms])
+
+            lists = list_centroids = None
+            if APPROXIMATE_INDEX and len(matrix) >= APPROXIMATE_MIN_VECTORS:
+                if rebuild or previous.list_centroids is None:
+                    lists, list_centroids = self._build_lists(matrix)
+                else:
+                    list_centroids = previous.list_centroids
+                    lists = self._extend_lists(matrix, previous.lists, list_centroids, first_new_row)
+
+            state = _IndexState(
+                mtime=mtime,
+                generation=snapshot["generation"],
+                matrix=matrix,
+                norms=norms,
+                hash_by_row=hash_by_row,
+                row_by_hash=snapshot["rows"],
+                references_by_hash=references_by_hash,
+                hash_by_reference=snapshot["references"],
+                lists=lists,
+                list_centroids=list_centroids,
+            )
+            self._state = state
+
+        logger.info(f"Vector index refreshed: {len(state.matrix)} vectors")
+        return state
+
+    @staticmethod
+    def _build_lists(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Partition the vectors into sqrt(n) lists around coarse centroids."""
+        from sklearn.cluster import MiniBatchKMeans
+
+        n_lists = int(np.sqrt(len(matrix)))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=42, batch_size=4096, n_init=1)
+        lists = kmeans.fit_predict(matrix).astype(np.int32)
+        logger.info(f"Approximate index built with {n_lists} lists")
+        return lists, kmeans.cluster_centers_.astype(np.float32)
+
+    @staticmethod
+    def _extend_lists(matrix: np.ndarray, lists: np.ndarray, list_centroids: np.ndarray, first_new_row: int) -> np.ndarray:
+        """Assign the new rows to their nearest list."""
+        if first_new_row >= len(matrix):
+            return lists
+        new_rows = np.asarray(matrix[first_new_row:])
+        assigned = np.argmax(new_rows @ list_centroids.T, axis=1).astype(np.int32)
+        return np.concatenate([lists, assigned])
+
+    def vector_for_reference(self, reference: str) -> Optional[np.ndarray]:
+        """Return the stored vector of a reference, if it was embedded."""
+        state = self.refresh()
+        row = state.row_by_hash.get(state.hash_by_reference.get(reference, ""))
+        if row is None or row >= len(state.matrix):
+            return None
+        return np.asarray(state.matrix[row])
+
+    def search(self, vector: np.ndarray, k: int = DEFAULT_TOP_K, exclude: Optional[str] = None) -> List[SearchHit]:
+        """
+        Find the stored references most similar to a vector.
+
+        Args:
+            vector: Query embedding
+            k: Number of references to return
+            exclude: Reference to leave out of the results (the query itself)
+
+        Returns:
+            List of (reference, cosine similarity), most similar first
+        """
+        state = self.refresh()
+        if len(state.matrix) == 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if state.lists is not None:
+            probes = np.argsort(-(state.list_centroids @ query))[:APPROXIMATE_PROBES]
+            candidates = np.where(np.isin(state.lists, probes))[0]
+            scores = np.asarray(state.matrix[candidates]) @ query / state.norms[candidates]
+        else:
+            candidates = None
+            scores = (state.matrix @ query) / state.norms
+
+        # Quelques lignes en plus pour compenser les vecteurs sans référence et la référence exclue,
+        # élargies tant que k références n'ont pas été trouvées
+        wanted = min(len(scores), k * 2 + 1)
+        while True:
+            hits = self._collect_hits(state, scores, candidates, wanted, k, exclude)
+            if len(hits) >= k or wanted >= len(scores):
+                return hits[:k]
+            wanted = min(len(scores), wanted * 4)
+
+    @staticmethod
+    def _collect_hits(
+        state: _IndexState,
+        scores: np.ndarray,
+        candidates: Optional[np.ndarray],
+        wanted: int,
+        k: int,
+        exclude: Optional[str]
+    ) -> List[SearchHit]:
+        """References of the best `wanted` rows, most similar first, stopping at k."""
+        if wanted == 0:
+            return []
+        best = np.argpartition(-scores, wanted - 1)[:wanted]
+        best = best[np.argsort(-scores[best])]
+
+        hits: List[SearchHit] = []
+        for position in best:
+            row = candidates[position] if candidates is not None else position
+            h = state.hash_by_row[row]
+            for ref in state.references_by_hash.get(h, []):
+                if ref != exclude:
+                    hits.append((ref, float(scores[position])))
+            if len(hits) >= k:
+                break
+        return hits
+
+
+_index: Optional[VectorIndex] = None
+
+
+def get_index(model: str) -> VectorIndex:
+    """Return the vector index of the server process, created on first use."""
+    global _index
+    if _index is None or _index.store.model != model:
+        _index = VectorIndex(EmbeddingStore(model=model))
+    return _index
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# Les modules de l'application sont importés comme depuis la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test in an empty working directory: the data files use relative paths."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,69 @@
+from email.utils import formatdate
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import Request  # noqa: E402
+
+from app.caching import ResponseCache, is_not_modified, make_etag, validator_headers  # noqa: E402
+
+LAST_MODIFIED = 1_700_000_000.0
+
+
+def _request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_etag_is_weak_and_depends_on_every_part():
+    etag = make_etag("dashboard", "v1")
+    assert etag.startswith('W/"')
+    assert etag == make_etag("dashboard", "v1")
+    assert etag != make_etag("dashboard", "v2")
+
+
+def test_matching_if_none_match_is_not_modified():
+    etag = make_etag("page")
+    assert is_not_modified(_request(if_none_match=etag), etag, LAST_MODIFIED)
+    # Comparaison faible : un client peut renvoyer la valeur sans le préfixe W/
+    assert is_not_modified(_request(if_none_match=etag.removeprefix("W/")), etag, LAST_MODIFIED)
+    assert is_not_modified(_request(if_none_match=f'"other", {etag}'), etag, LAST_MODIFIED)
+    assert is_not_modified(_request(if_none_match="*"), etag, LAST_MODIFIED)
+
+
+def test_other_etag_is_modified_even_with_a_recent_date():
+    etag = make_etag("page")
+    request = _request(if_none_match=make_etag("old"), if_modified_since=formatdate(LAST_MODIFIED + 60, usegmt=True))
+    assert not is_not_modified(request, etag, LAST_MODIFIED)
+
+
+def test_if_modified_since_is_compared_to_the_second():
+    etag = make_etag("page")
+    assert is_not_modified(_request(if_modified_since=formatdate(LAST_MODIFIED, usegmt=True)), etag, LAST_MODIFIED + 0.5)
+    assert not is_not_modified(_request(if_modified_since=formatdate(LAST_MODIFIED - 1, usegmt=True)), etag, LAST_MODIFIED)
+    assert not is_not_modified(_request(if_modified_since="not a date"), etag, LAST_MODIFIED)
+
+
+def test_request_without_validators_is_modified():
+    assert not is_not_modified(_request(), make_etag("page"), LAST_MODIFIED)
+
+
+def test_validator_headers_vary_on_the_encoding():
+    headers = validator_headers(make_etag("page"), LAST_MODIFIED)
+    assert headers["Vary"] == "Accept-Encoding"
+    assert headers["Last-Modified"] == formatdate(LAST_MODIFIED, usegmt=True)
+
+
+def test_response_cache_evicts_the_least_recently_used_entry():
+    cache = ResponseCache(maxsize=2)
+    cache.put("a", b"A", "text/html")
+    cache.put("b", b"B", "text/html")
+    assert cache.get("a") == (b"A", "text/html")
+    cache.put("c", b"C", "text/html")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
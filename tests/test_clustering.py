@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("scipy")
+
+from src.clustering import add_clean_text, apply_cluster_labels, detail_key, record_keys, records_frame  # noqa: E402
+from src.text import attach_clean_text  # noqa: E402
+
+
+def _detail(title, reference=None):
+    detail = {"title": title, "summary": f"Summary of {title}"}
+    if reference is not None:
+        detail["reference"] = reference
+    return attach_clean_text(detail)
+
+
+def _clustered_keys(details):
+    # Clés telles que run_clustering les enregistre dans ses résultats
+    df = records_frame(details)
+    add_clean_text(df, details)
+    return record_keys(df)
+
+
+def test_record_keys_match_detail_keys():
+    details = [_detail("Hydrogen", "REF-1"), _detail("Batteries"), _detail("Wind", "")]
+    assert _clustered_keys(details) == [detail_key(detail) for detail in details]
+
+
+def test_labels_follow_references_and_text_keys_after_new_details():
+    details = [_detail("Hydrogen", "REF-1"), _detail("Batteries"), _detail("Wind")]
+    keys = _clustered_keys(details)
+
+    # Un nouveau détail arrive en tête entre le clustering et l'application des labels
+    alert = {"lastDetails": [_detail("Solar")] + details}
+    changed = apply_cluster_labels(alert, keys, [0, 1, 2])
+
+    assert changed == 3
+    assert [detail.get("cluster") for detail in alert["lastDetails"]] == [None, 0, 1, 2]
+
+
+def test_unchanged_labels_are_not_counted():
+    details = [_detail("Hydrogen", "REF-1"), _detail("Batteries")]
+    details[0]["cluster"] = 4
+    alert = {"lastDetails": details}
+    assert apply_cluster_labels(alert, _clustered_keys(details), [4, 2]) == 1
+    assert details[0]["cluster"] == 4 and details[1]["cluster"] == 2
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from src.facet import FacetIndex  # noqa: E402
+
+VALUES = ["Horizon Europe", "Digital Europe", "LIFE", "Creative Europe", "EU4Health", "horizon 2020"]
+
+
+def test_prefix_matches_are_case_insensitive_and_sorted():
+    index = FacetIndex(VALUES)
+    assert index.suggest("hor") == ["horizon 2020", "Horizon Europe"]
+
+
+def test_infix_matches_follow_the_prefix_matches():
+    index = FacetIndex(VALUES + ["Europe Aid"])
+    assert index.suggest("europe") == ["Europe Aid", "Creative Europe", "Digital Europe", "Horizon Europe"]
+
+
+def test_value_matching_at_several_offsets_is_returned_once():
+    index = FacetIndex(["Banana"])
+    assert index.suggest("an") == ["Banana"]
+
+
+def test_limit_applies_to_prefix_and_infix_matches():
+    index = FacetIndex(VALUES)
+    assert index.suggest("e", limit=2) == ["EU4Health", "Creative Europe"]
+
+
+def test_empty_query_returns_the_first_values():
+    index = FacetIndex(VALUES + ["", "LIFE"])
+    assert index.suggest("  ", limit=3) == ["Creative Europe", "Digital Europe", "EU4Health"]
+
+
+def test_unknown_text_returns_nothing():
+    assert FacetIndex(VALUES).suggest("xyz") == []
@@ -0,0 +1,102 @@
+import asyncio
+
+from src.jobs import JobQueue
+from src.tracing import _current_span, span
+
+
+def test_pending_job_is_replaced_by_the_latest_submission():
+    async def scenario():
+        queue = JobQueue("test-coalesce")
+        ran = []
+        blocker = asyncio.Event()
+
+        async def block():
+            await blocker.wait()
+
+        def job(value):
+            async def run():
+                ran.append(value)
+            return run
+
+        # Le worker est occupé : les jobs de la clé "a" restent en attente
+        queue.submit("busy", block)
+        await asyncio.sleep(0)
+        assert queue.submit("a", job(1)) is True
+        assert queue.submit("a", job(2)) is False
+        blocker.set()
+        await queue._queue.join()
+        return queue, ran
+
+    queue, ran = asyncio.run(scenario())
+    assert ran == [2]
+    assert queue.coalesced == 1
+    assert queue.completed == 2
+
+
+def test_key_submitted_while_running_runs_again_afterwards():
+    async def scenario():
+        queue = JobQueue("test-deferred", workers=2)
+        started = asyncio.Event()
+        release = asyncio.Event()
+        ran = []
+
+        async def first():
+            started.set()
+            await release.wait()
+            ran.append("first")
+
+        async def second():
+            ran.append("second")
+
+        queue.submit("a", first)
+        await started.wait()
+        # Un second worker est libre, mais la clé en cours ne doit pas tourner deux fois en parallèle
+        queue.submit("a", second)
+        await asyncio.sleep(0.01)
+        assert ran == []
+        assert queue.is_pending("a")
+        release.set()
+        await queue._queue.join()
+        return queue, ran
+
+    queue, ran = asyncio.run(scenario())
+    assert ran == ["first", "second"]
+    assert not queue.is_pending("a")
+
+
+def test_failed_job_is_counted_and_does_not_stop_the_worker():
+    async def scenario():
+        queue = JobQueue("test-failure")
+        ran = []
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def succeed():
+            ran.append("ok")
+
+        queue.submit("a", fail)
+        queue.submit("b", succeed)
+        await queue._queue.join()
+        return queue, ran
+
+    queue, ran = asyncio.run(scenario())
+    assert queue.failed == 1
+    assert ran == ["ok"]
+
+
+def test_workers_do_not_inherit_the_span_of_the_first_caller():
+    async def scenario():
+        queue = JobQueue("test-context")
+        seen = []
+
+        async def record():
+            seen.append(_current_span.get())
+
+        # Le premier submit démarre les workers depuis le span du cycle
+        with span("cycle"):
+            queue.submit("a", record)
+        await queue._queue.join()
+        return seen
+
+    assert asyncio.run(scenario()) == [None]
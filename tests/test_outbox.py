@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from src import outbox  # noqa: E402
+
+
+@pytest.fixture
+def outbox_file(workdir, monkeypatch):
+    path = workdir / "outbox.json"
+    monkeypatch.setattr(outbox, "OUTBOX_PATH", str(path))
+    return path
+
+
+def _row(key):
+    return next(row for row in outbox.load_outbox() if row["id"] == key)
+
+
+def test_key_ignores_order_and_depends_on_the_detection():
+    key = outbox.outbox_key("alert", ["B", "A"], ["y@x", "x@x"], "1")
+    assert key == outbox.outbox_key("alert", ["A", "B"], ["x@x", "y@x"], "1")
+    assert key != outbox.outbox_key("alert", ["A", "B"], ["x@x", "y@x"], "2")
+    assert key != outbox.outbox_key("other", ["A", "B"], ["x@x", "y@x"], "1")
+
+
+def test_pending_notification_is_not_added_twice(outbox_file):
+    first = outbox.enqueue_notification("alert", ["x@x"], "subject", "body", ["A"], "1")
+    second = outbox.enqueue_notification("alert", ["x@x"], "subject", "body", ["A"], "1")
+    assert first == second
+    assert len(outbox.load_outbox()) == 1
+
+
+def test_sent_notification_with_the_same_key_is_enqueued_again(outbox_file):
+    key = outbox.enqueue_notification("alert", ["x@x"], "subject", "body", ["A"], "1")
+    outbox._record_results({key: True}, 100.0)
+    assert _row(key)["status"] == outbox.STATUS_SENT
+
+    outbox.enqueue_notification("alert", ["x@x"], "subject", "body", ["A"], "1")
+    rows = outbox.load_outbox()
+    assert len(rows) == 1
+    assert rows[0]["status"] == outbox.STATUS_PENDING
+
+
+def test_failures_back_off_then_give_up(outbox_file, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    key = outbox.enqueue_notification("alert", ["x@x"], "subject", "body", ["A"], "1")
+
+    outbox._record_results({key: False}, 1000.0)
+    row = _row(key)
+    assert row["attempts"] == 1
+    assert row["next_attempt_at"] == 1000.0 + outbox.OUTBOX_RETRY_BASE_SECONDS
+
+    outbox._record_results({key: False}, 2000.0)
+    assert _row(key)["next_attempt_at"] == 2000.0 + 2 * outbox.OUTBOX_RETRY_BASE_SECONDS
+
+    outbox._record_results({key: False}, 3000.0)
+    assert _row(key)["status"] == outbox.STATUS_FAILED
+
+
+def test_retry_delay_is_capped():
+    assert outbox._retry_delay(1) == outbox.OUTBOX_RETRY_BASE_SECONDS
+    assert outbox._retry_delay(100) == outbox.OUTBOX_RETRY_MAX_SECONDS
+
+
+def test_results_of_rows_no_longer_pending_are_ignored(outbox_file):
+    key = outbox.enqueue_notification("alert", ["x@x"], "subject", "body", ["A"], "1")
+    outbox._record_results({key: True}, 100.0)
+    outbox._record_results({key: False}, 200.0)
+    row = _row(key)
+    assert row["status"] == outbox.STATUS_SENT
+    assert row["attempts"] == 0
+
+
+def test_sent_rows_are_purged_after_the_retention(outbox_file):
+    key = outbox.enqueue_notification("alert", ["x@x"], "subject", "body", ["A"], "1")
+    outbox._record_results({key: True}, 100.0)
+    outbox._record_results({}, 100.0 + outbox.OUTBOX_SENT_RETENTION_SECONDS)
+    assert outbox.load_outbox() == []
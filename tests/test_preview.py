@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from src import fetch  # noqa: E402
+
+QUERY = {"bool": {"must": [{"terms": {"type": ["1"]}}]}}
+
+
+@pytest.fixture
+def fake_fetch(monkeypatch):
+    """Replace the API request of the previews with one released by the test."""
+    monkeypatch.setattr(fetch, "_preview_cache", {})
+    monkeypatch.setattr(fetch, "_preview_inflight", {})
+    state = {"calls": 0, "release": None}
+
+    async def _fetch_preview(query, digest, sample_size):
+        state["calls"] += 1
+        await state["release"].wait()
+        return {"totalResults": 3, "results": []}
+
+    monkeypatch.setattr(fetch, "_fetch_preview", _fetch_preview)
+    return state
+
+
+def test_identical_previews_share_one_request(fake_fetch):
+    async def scenario():
+        fake_fetch["release"] = asyncio.Event()
+        first = asyncio.create_task(fetch.preview_query(QUERY))
+        second = asyncio.create_task(fetch.preview_query(dict(QUERY)))
+        await asyncio.sleep(0)
+        fake_fetch["release"].set()
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(scenario())
+    assert first == second == {"totalResults": 3, "results": []}
+    assert fake_fetch["calls"] == 1
+    assert not fetch._preview_inflight
+
+
+def test_waiter_gets_the_preview_when_the_first_caller_is_cancelled(fake_fetch):
+    async def scenario():
+        fake_fetch["release"] = asyncio.Event()
+        owner = asyncio.create_task(fetch.preview_query(QUERY))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(fetch.preview_query(QUERY))
+        await asyncio.sleep(0)
+        # Le client du premier appel est parti
+        owner.cancel()
+        await asyncio.sleep(0)
+        fake_fetch["release"].set()
+        return owner, await waiter
+
+    owner, preview = asyncio.run(scenario())
+    assert owner.cancelled()
+    assert preview["totalResults"] == 3
+    assert fake_fetch["calls"] == 1
+
+
+def test_cached_preview_is_returned_without_request(fake_fetch):
+    async def scenario():
+        fake_fetch["release"] = asyncio.Event()
+        fake_fetch["release"].set()
+        await fetch.preview_query(QUERY)
+        return await fetch.preview_query(QUERY)
+
+    assert asyncio.run(scenario())["totalResults"] == 3
+    assert fake_fetch["calls"] == 1
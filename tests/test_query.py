@@ -0,0 +1,34 @@
+from src.query import canonicalize_query, generate_query, query_digest
+
+
+def test_terms_are_sorted_deduplicated_and_stringified():
+    query = {"bool": {"must": [{"terms": {"type": [8, "1", "2", "1"]}}]}}
+    assert canonicalize_query(query) == {"bool": {"must": [{"terms": {"type": ["1", "2", "8"]}}]}}
+
+
+def test_clause_order_does_not_change_the_digest():
+    first = {"bool": {"must": [{"terms": {"type": ["1"]}}, {"terms": {"status": ["31094501"]}}]}}
+    second = {"bool": {"must": [{"terms": {"status": ["31094501"]}}, {"terms": {"type": ["1"]}}]}}
+    assert query_digest(first) == query_digest(second)
+
+
+def test_range_without_bounds_is_dropped():
+    query = {"bool": {"must": [
+        {"terms": {"type": ["1"]}},
+        {"range": {"startDate": {"gte": None, "lte": None}}},
+    ]}}
+    assert canonicalize_query(query) == {"bool": {"must": [{"terms": {"type": ["1"]}}]}}
+
+
+def test_different_queries_have_different_digests():
+    assert query_digest({"bool": {"must": [{"terms": {"type": ["1"]}}]}}) != \
+        query_digest({"bool": {"must": [{"terms": {"type": ["2"]}}]}})
+
+
+def test_missing_query_is_not_the_empty_query():
+    assert query_digest(None) != query_digest({})
+    assert query_digest(None) == query_digest(None)
+
+
+def test_generated_query_digest_is_stable():
+    assert query_digest(generate_query()) == query_digest(generate_query())